@@ -5,21 +5,24 @@ echo ========================================
 echo.
 
 :loop
-echo [%date% %time%] Python script execution...
-python "easybourse_valorisation.py"
+echo [%date% %time%] Python script execution (daemon mode)...
+echo Use Ctrl+C to stop the script
+REM Updates every 15 minutes during market hours, every hour otherwise
+python "easybourse_valorisation.py" --daemon --interval 3600 --market-interval 900
 
 if %errorlevel% neq 0 (
     echo [%date% %time%] ERROR: The python script has encountered an error (code: %errorlevel%)
 ) else (
-    echo [%date% %time%] Successfully executed the script.
+    echo [%date% %time%] The python script has stopped.
+    goto end
 )
 
 echo.
-echo Next execution in 1 hour...
-echo Use Ctrl+C to stop the script
+echo Restarting in 1 minute...
 echo ----------------------------------------
 
-REM Wait 3600 seconds (1 hour)
-timeout /t 3600 /nobreak > nul
+timeout /t 60 /nobreak > nul
+
+goto loop
 
-goto loop
\ No newline at end of file
+:end
@@ -0,0 +1,43 @@
+"""Full rebuild vs incremental update of the analytics tables when one date is added
+
+Usage: python benchmarks/bench_analytics.py [positions]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import build_history
+from easybourse_analytics import AnalyticsTables
+
+logging.disable(logging.INFO)
+
+
+def main():
+    n_positions = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    print(f"{'rows':>8} {'rebuild (s)':>12} {'update (s)':>11}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_rows in (3_000, 30_000, 300_000):
+            history = build_history(n_rows // n_positions + 1, n_positions)
+            last_date = history['Date'].max()
+            stored, df_new = history[history['Date'] < last_date], history[history['Date'] == last_date]
+            tables = AnalyticsTables(os.path.join(tmp_dir, f'analytics_{n_rows}'))
+
+            start = time.perf_counter()
+            tables.rebuild(history)
+            t_rebuild = time.perf_counter() - start
+
+            tables.rebuild(stored)
+            start = time.perf_counter()
+            tables.update(df_new, lambda: pd.concat([stored, df_new]))
+            t_update = time.perf_counter() - start
+            print(f"{n_rows:>8} {t_rebuild:>12.2f} {t_update:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""Benchmark of the Excel writers: openpyxl (cell by cell) against xlsxwriter (streaming)
+
+Usage: python benchmarks/bench_excel_writer.py [positions]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import build_history
+from easybourse_excel import write_data_sheet
+
+logging.disable(logging.INFO)
+
+
+def main():
+    n_positions = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print(f"{'rows':>10} {'openpyxl (s)':>14} {'xlsxwriter (s)':>15} {'speed-up':>9}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_rows in (5_000, 20_000, 50_000, 100_000):
+            history = build_history(n_rows // n_positions, n_positions)
+            timings = {}
+            for engine in ('openpyxl', 'xlsxwriter'):
+                path = os.path.join(tmp_dir, f'{engine}.xlsx')
+                start = time.perf_counter()
+                write_data_sheet(history, path, engine)
+                timings[engine] = time.perf_counter() - start
+            print(f"{n_rows:>10} {timings['openpyxl']:>14.2f} {timings['xlsxwriter']:>15.2f} "
+                  f"{timings['openpyxl'] / timings['xlsxwriter']:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""Size and load-time comparison of the wide and normalized (Data + Totals) workbook layouts
+
+Usage: python benchmarks/bench_layout.py [positions]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import build_history
+from easybourse_excel import read_history, write_data_sheet
+
+logging.disable(logging.INFO)
+
+
+def main():
+    n_positions = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    print(f"{'rows':>8} {'layout':>11} {'size (KiB)':>11} {'save (s)':>9} {'load (s)':>9}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_rows in (3_000, 30_000, 90_000):
+            history = build_history(n_rows // n_positions, n_positions)
+            for normalized in (False, True):
+                path = os.path.join(tmp_dir, f'layout_{normalized}.xlsx')
+                start = time.perf_counter()
+                write_data_sheet(history, path, normalized=normalized)
+                t_save = time.perf_counter() - start
+                start = time.perf_counter()
+                read_history(path)
+                t_load = time.perf_counter() - start
+                layout = 'normalized' if normalized else 'wide'
+                print(f"{n_rows:>8} {layout:>11} {os.path.getsize(path) / 1024:>11.0f} {t_save:>9.2f} {t_load:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Benchmark of the keyed upsert engine on growing histories
+
+Usage: python benchmarks/bench_merge.py [positions]
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import build_history
+from easybourse_history import upsert_positions
+
+
+def main():
+    n_positions = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print(f"{'rows':>10} {'new date (s)':>14} {'same date (s)':>14} {'µs/row':>8}")
+    for n_rows in (10_000, 50_000, 100_000, 200_000, 400_000):
+        history = build_history(n_rows // n_positions, n_positions)
+        last = history[history['Date'] == history['Date'].max()]
+
+        # Next trading day appended at the end
+        block_new = last.assign(Date=last['Date'] + pd.offsets.BDay(1))
+        start = time.perf_counter()
+        upsert_positions(history, block_new)
+        t_new = time.perf_counter() - start
+
+        # Intraday refresh of the last date block
+        block_same = last.assign(Cours=last['Cours'] + 1)
+        start = time.perf_counter()
+        upsert_positions(history, block_same)
+        t_same = time.perf_counter() - start
+
+        print(f"{n_rows:>10} {t_new:>14.3f} {t_same:>14.3f} {t_new / n_rows * 1e6:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
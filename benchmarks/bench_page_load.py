@@ -0,0 +1,117 @@
+"""Page-ready latency of the full and lean Chrome profiles against a local fixture site
+
+The fixture login page loads a stylesheet, a web font, images, a video and a
+blocking "tracker" script, each answered after a delay. Page ready is the time
+from driver.get() to the username field being present. Requires Chrome.
+
+Usage: python benchmarks/bench_page_load.py [delay_ms] [repeat]
+"""
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from easybourse_valorisation import LEAN_BLOCKED_URLS, EasyBourseValorisationDownloader
+
+logging.disable(logging.WARNING)
+
+N_IMAGES = 30
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head>
+<link rel="stylesheet" href="/static/style.css">
+<script src="/tracker/gtm.js"></script>
+</head><body>
+<h1>Connexion</h1>
+<form><input id="username" name="username"><button type="button">Ok pour moi</button></form>
+{images}
+<video src="/media/intro.mp4" autoplay muted></video>
+</body></html>
+"""
+
+ASSETS = {
+    '/static/style.css': ('text/css', b"@font-face { font-family: f; src: url(/fonts/f.woff2); } body { font-family: f; }"),
+    '/tracker/gtm.js': ('application/javascript', b"window.tracked = true;"),
+    '/fonts/f.woff2': ('font/woff2', b'\0' * 100_000),
+    '/media/intro.mp4': ('video/mp4', b'\0' * 500_000),
+}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    delay = 0.1
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/login':
+            images = '\n'.join(f'<img src="/img/{i}.png">' for i in range(N_IMAGES))
+            content_type, body = 'text/html', LOGIN_PAGE.format(images=images).encode()
+        elif path.startswith('/img/'):
+            content_type, body = 'image/png', b'\0' * 50_000
+        elif path in ASSETS:
+            content_type, body = ASSETS[path]
+        else:
+            self.send_error(404)
+            return
+        if path != '/login':
+            time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def page_ready(driver, url):
+    """Return the seconds from driver.get() to the username field, with a cold cache"""
+    driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+    start = time.perf_counter()
+    driver.get(url)
+    WebDriverWait(driver, 30).until(EC.presence_of_element_located((By.ID, 'username')))
+    return time.perf_counter() - start
+
+
+def main():
+    FixtureHandler.delay = (int(sys.argv[1]) if len(sys.argv) > 1 else 100) / 1000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/login'
+
+    print(f"{'profile':>8} {'p50 (ms)':>9} {'max (ms)':>9} {'requests':>9}")
+    try:
+        for lean in (False, True):
+            # The fixture tracker is served locally, block it as the tracking hosts would be
+            downloader = EasyBourseValorisationDownloader(None, None, lean_profile=lean,
+                                                          blocked_urls=LEAN_BLOCKED_URLS + ['*/tracker/*'])
+            try:
+                driver = downloader.setup_driver()
+            except WebDriverException as e:
+                print(f"Chrome is not available: {e.msg}")
+                return
+            try:
+                timings = [page_ready(driver, url) for _ in range(repeat)]
+                requests = driver.execute_script("return performance.getEntriesByType('resource').length")
+            finally:
+                driver.quit()
+            print(f"{'lean' if lean else 'full':>8} {statistics.median(timings) * 1000:>9.0f} "
+                  f"{max(timings) * 1000:>9.0f} {requests:>9}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Microbenchmark of parse_csv_data against the previous line-by-line parser
+
+Usage: python benchmarks/bench_parser.py
+"""
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_export_csv
+from easybourse_valorisation import EasyBourseValorisationDownloader
+
+logging.disable(logging.WARNING)
+
+
+def legacy_parse_positions(csv_path):
+    """Positions table parsing as done before the vectorized parser (totals omitted)"""
+    with open(csv_path, 'r', encoding='cp1252') as f:
+        content = f.read()
+    lines = content.split('\n')
+    header_index = next(i for i, line in enumerate(lines) if 'Valeur;Code Isin;Place de cotation' in line)
+    positions_lines = [line for line in lines[header_index:] if line.strip() and ';' in line]
+    df = pd.read_csv(io.StringIO('\n'.join(positions_lines)), sep=';', decimal=',')
+    df.columns = df.columns.str.strip()
+    for col in ['Quantité', 'Cours', 'Prix moyen', 'Valorisation', '+/- value', 'Performance (%)', 'Poids']:
+        def safe_convert(x):
+            if pd.isna(x):
+                return x
+            try:
+                return float(str(x).strip().replace(' ', '').replace(',', '.').replace('%', ''))
+            except ValueError:
+                return None
+        df[col] = df[col].apply(safe_convert)
+    return df
+
+
+def measure(func, *args, repeat=3):
+    """Return (best seconds, peak MiB, result) of func(*args), memory traced in a separate run"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return min(timings), peak, result
+
+
+def main():
+    downloader = EasyBourseValorisationDownloader('user', 'password')
+    print(f"{'positions':>10} {'legacy (ms)':>12} {'new (ms)':>9} {'legacy MiB':>11} {'new MiB':>8} {'frame KiB':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_positions in (50, 500, 5_000, 50_000):
+            path = os.path.join(tmp_dir, f'export_{n_positions}.csv')
+            write_export_csv(path, n_positions)
+            t_old, m_old, _ = measure(legacy_parse_positions, path)
+            t_new, m_new, df = measure(downloader.parse_csv_data, path)
+            print(f"{n_positions:>10} {t_old * 1000:>12.1f} {t_new * 1000:>9.1f} {m_old:>11.2f} {m_new:>8.2f} "
+                  f"{df.memory_usage(deep=True).sum() / 1024:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Check the login and export download against the local stand-in site, without Chrome
+
+Covers the login (keypad rendered in place, rejected id or password, changed layout)
+and the classes of its failures, the HTTP export with the session cookies of the
+browser, an expired session, an export answered with a page (falling back to the
+browser download), a full run and the parallel fetch of several accounts.
+
+Usage: python benchmarks/check_fake_site.py
+Exits with status 1 when a check fails.
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_site import EXPORT_PATH, FakeDriver, FakeSite, FakeSiteDownloader
+from synthetic import build_history, format_export
+from easybourse_accounts import run_accounts
+from easybourse_excel import read_history
+from easybourse_history import ACCOUNT_COLUMN
+from easybourse_valorisation import CREDENTIALS_FAILURE, EMPTY_EXPORT_FAILURE, LAYOUT_FAILURE
+
+logging.disable(logging.ERROR)
+
+
+def check(failures, name, condition, detail=''):
+    print(f"{'ok  ' if condition else 'FAIL'} {name}" + ('' if condition else f": {detail}"))
+    if not condition:
+        failures.append(name)
+
+
+def check_login(failures, site, directory):
+    """Log in with the real login steps, and fail them in each way the site can"""
+    def login(password='1234', timeouts=None):
+        downloader = FakeSiteDownloader('alice', password, download_dir=directory, base_url=site.url,
+                                        timeouts=timeouts)
+        start = time.perf_counter()
+        logged_in = downloader.login(downloader.setup_driver())
+        return logged_in, downloader.failure, time.perf_counter() - start
+
+    logged_in, failure, _ = login()
+    check(failures, "login through the keypad", logged_in and site.logins == 1, failure)
+
+    # The keypad is rendered in place (no new page) after the 2s settle delay: a slow page, not a layout change
+    site.keypad_delay = 3
+    logged_in, failure, _ = login()
+    site.keypad_delay = 0
+    check(failures, "keypad rendered in place after 3s", logged_in, failure)
+
+    logged_in, failure, _ = login('0000')
+    check(failures, "wrong password fails as credentials", not logged_in and failure == CREDENTIALS_FAILURE, failure)
+
+    site.silent_rejection = True
+    logged_in, failure, _ = login('0000', timeouts={'post_login': 1})
+    site.silent_rejection = False
+    check(failures, "wrong password without message fails as credentials",
+          not logged_in and failure == CREDENTIALS_FAILURE, failure)
+
+    site.username_field = False
+    logged_in, failure, seconds = login()
+    site.username_field = True
+    check(failures, "login page without the id field fails as layout before its timeout",
+          not logged_in and failure == LAYOUT_FAILURE and seconds < 5, f"{failure} after {seconds:.1f}s")
+
+
+def check_accounts(failures):
+    """Fetch two accounts in parallel through the browser download, then over HTTP"""
+    accounts = [{'name': 'alice', 'id': 'alice', 'password': '1234'}, {'name': 'bob', 'id': 'bob', 'password': '5678'}]
+    exports = {'alice': format_export(build_history(1, 20, seed=1)), 'bob': format_export(build_history(1, 20, seed=2))}
+    site = FakeSite({'alice': ('1234', exports['alice']), 'bob': ('5678', exports['bob'])})
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            excel_path = os.path.join(directory, 'EasyBourse.xlsx')
+            work_dir = os.path.join(directory, 'work')
+            downloader = FakeSiteDownloader(None, None, base_url=site.url, download_mode='browser', analytics=False)
+
+            # Both workers download a file of the same name, each in its own directory
+            ok = run_accounts(downloader, accounts, excel_path, work_dir=work_dir)
+            downloaded = {}
+            for account in exports:
+                path = os.path.join(work_dir, account, 'downloads', 'valorisation.csv')
+                with open(path, 'rb') as f:
+                    downloaded[account] = f.read()
+            check(failures, "each account downloads in its own directory", ok and downloaded == exports)
+
+            df = read_history(excel_path)
+            check(failures, "accounts merged with the account column",
+                  len(df) == 40 and sorted(df[ACCOUNT_COLUMN].unique()) == ['alice', 'bob']
+                  and df.groupby(ACCOUNT_COLUMN)['Code Isin'].nunique().tolist() == [20, 20],
+                  df.groupby(ACCOUNT_COLUMN).size().to_dict())
+
+            ok = run_accounts(downloader, accounts, excel_path, options={'download_mode': 'http'})
+            check(failures, "HTTP exports of both accounts merged again in place",
+                  ok and len(read_history(excel_path)) == 40 and site.logins == 4, f"{site.logins} logins")
+
+            # The same date already stored by a single-account run would be counted twice
+            single_path = os.path.join(directory, 'Single.xlsx')
+            FakeSiteDownloader(None, None, analytics=False).save_history(build_history(1, 20, seed=1), single_path)
+            ok = run_accounts(downloader, accounts, single_path)
+            check(failures, "accounts refused on a date stored without account",
+                  not ok and len(read_history(single_path)) == 20)
+    finally:
+        site.close()
+
+
+def main():
+    history = build_history(1, 20)
+    site = FakeSite({'alice': ('1234', format_export(history))})
+    failures = []
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            downloader = FakeSiteDownloader('alice', '1234', download_dir=directory, base_url=site.url,
+                                            analytics=False)
+            check_login(failures, site, directory)
+            driver = downloader.setup_driver()
+            check(failures, "login sets the session cookie", downloader.login(driver)
+                  and [c['name'] for c in driver.get_cookies()] == ['SESSION'], driver.get_cookies())
+
+            # HTTP export: in memory, with the cookies and user agent of the browser
+            df, csv_path = downloader.fetch(driver)
+            path, user, user_agent = site.requests[-1]
+            check(failures, "HTTP export in memory", df is not None and len(df) == 20 and csv_path is None,
+                  f"csv_path {csv_path}")
+            check(failures, "HTTP export sends the session", (path, user, user_agent)
+                  == (EXPORT_PATH, 'alice', FakeDriver.user_agent), site.requests[-1])
+            check(failures, "no file left in the download directory", os.listdir(directory) == [],
+                  os.listdir(directory))
+
+            # The site answers a page instead of the CSV: the browser download takes over
+            site.html_answers = 1
+            df, csv_path = downloader.fetch(driver)
+            check(failures, "page instead of CSV falls back to the browser download",
+                  df is not None and len(df) == 20 and csv_path is not None and os.path.exists(csv_path),
+                  f"csv_path {csv_path}")
+            downloader.remove_csv(csv_path)
+
+            # Expired session: both downloads get the login page
+            site.sessions.clear()
+            downloader.failure = None
+            df, csv_path = downloader.fetch(driver)
+            check(failures, "expired session fails as empty_export",
+                  df is None and downloader.failure == EMPTY_EXPORT_FAILURE, downloader.failure)
+            check(failures, "expired session detected", not downloader.session_alive(driver))
+
+            # A run with the expired driver logs in again and stores the export
+            excel_path = os.path.join(directory, 'EasyBourse.xlsx')
+            logins = site.logins
+            check(failures, "run logs in again and updates the history",
+                  downloader.run(excel_path, driver=driver) and len(read_history(excel_path)) == 20
+                  and site.logins == logins + 1, f"{site.logins - logins} logins")
+            check(failures, "next run reuses the session", downloader.run(excel_path, driver=driver)
+                  and site.logins == logins + 1, f"{site.logins - logins} logins")
+    finally:
+        site.close()
+    check_accounts(failures)
+
+    print(f"{'FAILED' if failures else 'OK'}: {len(failures)} failed checks")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Check the virtual keyboard detection against the stand-in password page
+
+FIND_VIRTUAL_KEYBOARD_JS must map every digit to its keypad button, whatever the
+order of the keys, and typing a code through that mapping must enter it. Requires Chrome.
+
+Usage: python benchmarks/check_keypad.py [repeat]
+Exits with status 1 when a check fails, 2 when Chrome is not available (nothing checked).
+"""
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from selenium.common.exceptions import WebDriverException
+
+from fake_site import keypad_page
+from easybourse_valorisation import EasyBourseValorisationDownloader
+
+logging.disable(logging.WARNING)
+
+CODE = '20481357'
+
+# Exit status when Chrome cannot be started: the keypad was not checked, which must not pass as a success
+SKIPPED = 2
+
+
+def check_page(downloader, driver, url):
+    """Return the failures of the keypad detection on one load of the page"""
+    driver.get(url)
+    keypad = downloader.find_virtual_keyboard(driver)
+    if keypad is None:
+        return ["keypad not detected"]
+    if sorted(keypad) != list('0123456789'):
+        return [f"keys found: {sorted(keypad)}"]
+    failures = [f"'{digit}' mapped to {element.tag_name} '{element.get_attribute('data-digit')}'"
+                for digit, element in keypad.items() if element.get_attribute('data-digit') != digit]
+    if not failures:
+        for digit in CODE:
+            keypad[digit].click()
+        typed = driver.execute_script("return document.querySelector('[name=code]').value")
+        if typed != CODE:
+            failures.append(f"typed {typed!r} instead of {CODE!r}")
+    return failures
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    downloader = EasyBourseValorisationDownloader(None, None)
+    try:
+        driver = downloader.setup_driver()
+    except WebDriverException as e:
+        print(f"SKIPPED: Chrome is not available, keypad not checked: {e.msg}")
+        return SKIPPED
+
+    failures = []
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            page = os.path.join(directory, 'password.html')
+            for i in range(repeat):
+                # The digits are shuffled on every load, as on the site
+                with open(page, 'w', encoding='utf-8') as f:
+                    f.write(keypad_page())
+                failures += [f"load {i + 1}: {failure}" for failure in check_page(downloader, driver,
+                                                                                  f'file://{page}')]
+    finally:
+        driver.quit()
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print(f"{'FAILED' if failures else 'OK'}: keypad detection on {repeat} shuffled pages")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,300 @@
+"""Local stand-in for the EasyBourse pages, for the checks that need no real account
+
+The password page mimics the EasyBourse keypad: digits shuffled on every load, in
+buttons with generated (jss) class names, next to other single-digit elements
+(steps, a hidden keypad) that the keypad detection must ignore.
+
+FakeSite serves the login, the account page and the CSV export over HTTP with a
+session cookie; FakeSiteDownloader runs the downloader, its login included, against
+it with FakeDriver. FakeDriver is a browser stand-in: it follows redirects, keeps
+cookies, saves attachments in its download directory as Chrome does, and renders the
+login form as the site does (cookie banner, id, then the keypad re-rendered in place),
+answering the page scripts of the downloader from that rendering.
+"""
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webelement import WebElement
+
+from easybourse_valorisation import (FIND_LOGIN_ERROR_JS, FIND_VIRTUAL_KEYBOARD_JS, PAGE_STATE_JS,
+                                     EasyBourseValorisationDownloader)
+
+EXPORT_PATH = '/easybourse/secure/exportCsvValorisationTempsReel.html'
+
+# Rendered by FakeDriver: the id field (unless missing), the error message and the keypad render delay
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><body><div id="root" data-keypad-delay="{keypad_delay}">{error}
+<form method="post" action="/login">{username}<button>Continuer</button></form>
+</div></body></html>
+"""
+USERNAME_FIELD = '<input name="username">'
+LOGIN_ERROR = '<div role="alert">Identifiant ou mot de passe incorrect</div>'
+
+KEYPAD_PAGE = """<!DOCTYPE html>
+<html><head><style>.jss5 {{ display: none; }}</style></head><body>
+<ol class="jss2"><li class="jss3">1</li><li class="jss3">2</li></ol>
+<div class="jss5">{hidden_keys}</div>
+<form>
+<input class="jss7" type="password" name="code" readonly>
+<div class="jss11">{keys}</div>
+<button class="MuiButton-root jss14" type="button">Se connecter</button>
+</form>
+<footer><span class="jss3">4</span></footer>
+<script>
+for (const key of document.querySelectorAll('.jss11 button')) {{
+    key.onclick = () => {{ document.querySelector('[name=code]').value += key.dataset.digit; }};
+}}
+</script>
+</body></html>
+"""
+
+KEYPAD_KEY = ('<button class="MuiButton-root jss12" type="button" data-digit="{digit}">'
+              '<span class="MuiButton-label jss13">{digit}</span></button>')
+
+
+def keypad_page(order=None):
+    """Return the password page with its keypad digits in the given order (shuffled by default)"""
+    order = order or random.sample('0123456789', 10)
+    keys = ''.join(KEYPAD_KEY.format(digit=digit) for digit in order)
+    hidden_keys = ''.join(f'<span class="jss6">{digit}</span>' for digit in '0123456789')
+    return KEYPAD_PAGE.format(keys=keys, hidden_keys=hidden_keys)
+
+
+class FakeSite:
+    """EasyBourse stand-in: accounts is {id: (password, export bytes)}
+
+    The export answers the CSV as an attachment to a logged-in session and the login
+    page otherwise, as the site does once the session has expired. html_answers
+    exports of a logged-in session are answered with the login page all the same.
+    The login page can be changed: keypad_delay (seconds to render the keypad),
+    silent_rejection (a wrong password shows no message), no username field.
+    """
+
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self.sessions = {}
+        self.html_answers = 0
+        self.keypad_delay = 0
+        self.silent_rejection = False
+        self.username_field = True
+        self.requests = []
+        self.logins = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler())
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def login_page(self, error=False):
+        return LOGIN_PAGE.format(keypad_delay=self.keypad_delay, error=LOGIN_ERROR if error else '',
+                                 username=USERNAME_FIELD if self.username_field else '').encode()
+
+    def handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                cookie = dict(c.strip().split('=', 1) for c in self.headers.get('Cookie', '').split(';') if '=' in c)
+                user = site.sessions.get(cookie.get('SESSION'))
+                site.requests.append((path, user, self.headers.get('User-Agent')))
+                if path == EXPORT_PATH and user and site.html_answers:
+                    site.html_answers -= 1
+                    self.answer(200, site.login_page())
+                elif path == EXPORT_PATH and user:
+                    self.answer(200, site.accounts[user][1], 'text/csv; charset=iso-8859-1',
+                                [('Content-Disposition', 'attachment; filename="valorisation.csv"')])
+                elif path == EXPORT_PATH or path == '/login':
+                    self.answer(200, site.login_page())
+                elif path == '/secure/compte/valorisation' and user:
+                    self.answer(200, b'<html><body>Valorisation</body></html>')
+                else:
+                    self.answer(302, b'', headers=[('Location', '/login')])
+
+            def do_POST(self):
+                form = urllib.parse.parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+                username, password = form.get('username', [''])[0], form.get('password', [''])[0]
+                if username in site.accounts and site.accounts[username][0] == password:
+                    token = secrets.token_hex(8)
+                    site.sessions[token] = username
+                    site.logins += 1
+                    self.answer(302, b'', headers=[('Location', '/secure/compte/valorisation'),
+                                                   ('Set-Cookie', f'SESSION={token}; Path=/')])
+                else:
+                    self.answer(200, site.login_page(error=not site.silent_rejection))
+
+            def answer(self, status, body, content_type='text/html', headers=()):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class FakeElement(WebElement):
+    """An element of the login form rendered by FakeDriver"""
+
+    def __init__(self, tag, text='', name=None, on_click=None):
+        self._id = f'{tag}-{name or text}-{id(self)}'
+        self._tag = tag
+        self._text = text
+        self.name = name
+        self.value = ''
+        self.visible = True
+        self.on_click = on_click
+
+    def __repr__(self):
+        return f'<FakeElement {self._tag} {self.name or self._text!r}>'
+
+    @property
+    def tag_name(self):
+        return self._tag
+
+    @property
+    def text(self):
+        return self._text
+
+    def get_attribute(self, name):
+        return {'name': self.name, 'value': self.value}.get(name)
+
+    def is_displayed(self):
+        return self.visible
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        if self.on_click:
+            self.on_click()
+
+    def send_keys(self, *keys):
+        self.value += ''.join(keys)
+
+
+class FakeDriver:
+    """The WebDriver calls of the downloader, over urllib"""
+
+    user_agent = 'Mozilla/5.0 (FakeDriver)'
+
+    def __init__(self, download_dir):
+        self.download_dir = download_dir
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        self.opener.addheaders = [('User-Agent', self.user_agent)]
+        self.current_url = 'about:blank'
+        # A new document per navigation, as performance.timeOrigin
+        self.time_origin = 0
+        self.elements = []
+        self.keypad = None
+        self.keypad_at = None
+
+    def get(self, url, data=None):
+        with self.opener.open(url, data=data) as response:
+            body = response.read()
+            disposition = response.headers.get('Content-Disposition', '')
+            if 'attachment' in disposition:
+                # A download leaves the browser on the current page
+                filename = disposition.split('filename=')[1].strip('"')
+                with open(os.path.join(self.download_dir, filename), 'wb') as f:
+                    f.write(body)
+                return
+            self.current_url = response.geturl()
+        self.time_origin += 1
+        self.render(body.decode())
+
+    def render(self, html):
+        """Render the login form of a login page, nothing for other pages"""
+        self.elements, self.keypad, self.keypad_at = [], None, None
+        if '/login' not in self.current_url:
+            return
+        error = re.search(r'role="alert">([^<]*)<', html)
+        if error:
+            self.elements.append(FakeElement('div', error.group(1), name='alert'))
+        banner = FakeElement('button', 'Ok pour moi')
+        banner.on_click = lambda: setattr(banner, 'visible', False)
+        self.elements.append(banner)
+        if USERNAME_FIELD in html:
+            self.elements.append(FakeElement('input', name='username'))
+        delay = float(re.search(r'data-keypad-delay="([^"]*)"', html).group(1))
+        self.elements.append(FakeElement('button', 'Continuer', on_click=lambda: self.show_keypad(delay)))
+
+    def show_keypad(self, delay):
+        """Continuer: the form is re-rendered in place with the keypad, once delay has passed"""
+        username = self.find_element(By.NAME, 'username').value
+        code = FakeElement('input', name='code')
+        self.elements = [code]
+        self.keypad = {digit: FakeElement('button', digit, on_click=lambda d=digit: code.send_keys(d))
+                       for digit in random.sample('0123456789', 10)}
+        self.keypad_at = time.perf_counter() + delay
+
+        def submit():
+            form = urllib.parse.urlencode({'username': username, 'password': code.value}).encode()
+            self.get(self.current_url.split('?')[0], data=form)
+        self.elements.append(FakeElement('button', 'Se connecter', on_click=submit))
+
+    def rendered(self):
+        elements = list(self.elements)
+        if self.keypad and time.perf_counter() >= self.keypad_at:
+            elements += list(self.keypad.values())
+        return elements
+
+    def find_elements(self, by, value):
+        if by == By.NAME:
+            return [e for e in self.rendered() if e.name == value]
+        if by == By.XPATH:
+            text = re.fullmatch(r"//button\[contains\(text\(\), '(.*)'\)\]", value).group(1)
+            return [e for e in self.rendered() if e.tag_name == 'button' and text in e.text]
+        raise NotImplementedError(by)
+
+    def find_element(self, by, value):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"{by} {value}")
+        return elements[0]
+
+    def get_cookies(self):
+        return [{'name': cookie.name, 'value': cookie.value} for cookie in self.cookies]
+
+    def execute_script(self, script):
+        if script == PAGE_STATE_JS:
+            return [self.time_origin, 'complete']
+        if script == FIND_LOGIN_ERROR_JS:
+            return next((e.text for e in self.rendered() if e.name == 'alert'), None)
+        if script == FIND_VIRTUAL_KEYBOARD_JS:
+            keys = {e.text: e for e in self.rendered() if self.keypad and e in self.keypad.values()}
+            return keys if len(keys) == 10 else None
+        if script == "return navigator.userAgent":
+            return self.user_agent
+        raise NotImplementedError(script)
+
+    def quit(self):
+        pass
+
+
+class FakeSiteDownloader(EasyBourseValorisationDownloader):
+    """Downloader for a FakeSite (given as base_url), driving FakeDriver instead of Chrome"""
+
+    def setup_driver(self):
+        return FakeDriver(self.download_dir)
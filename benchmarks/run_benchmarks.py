@@ -0,0 +1,233 @@
+"""Benchmark suite: time and peak memory of every stage of a run, with regression flags
+
+Usage: python benchmarks/run_benchmarks.py [--sizes 10x1,50x250,100x1000] [--stages parse,merge] [--repeat 3]
+                                           [--save-baseline FILE] [--baseline FILE] [--threshold 1.5]
+Sizes are POSITIONSxDATES of the stored history; each case adds one more date to it.
+Exits with status 1 when a stage is slower, or uses more memory, than the baseline by more than the threshold.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import build_history, format_export
+from easybourse_analytics import AnalyticsTables
+from easybourse_backup import SnapshotBackup
+from easybourse_excel import read_history, write_data_sheet
+from easybourse_history import fingerprint_dates, upsert_positions
+from easybourse_quality import check_blocks
+from easybourse_valorisation import EasyBourseValorisationDownloader
+
+logging.disable(logging.WARNING)
+
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS = 0.005
+MIN_MIB = 1.0
+
+
+class Case:
+    """Files and frames of one benchmark size: a stored history and the export of the next date"""
+
+    def __init__(self, work_dir, n_positions, n_dates):
+        self.work_dir = work_dir
+        history = build_history(n_dates + 1, n_positions)
+        last_date = history['Date'].max()
+        self.stored = history[history['Date'] < last_date].reset_index(drop=True)
+        self.df_new = history[history['Date'] == last_date].reset_index(drop=True)
+        self.history = history
+        self.downloader = EasyBourseValorisationDownloader(None, None)
+
+        self.csv_path = os.path.join(work_dir, 'export.csv')
+        with open(self.csv_path, 'wb') as f:
+            f.write(format_export(self.df_new))
+        self.excel_path = os.path.join(work_dir, 'EasyBourse.xlsx')
+        write_data_sheet(self.stored, self.excel_path)
+
+        # Backups and analytics already holding the stored history
+        self.backup_seed = os.path.join(work_dir, 'backup_seed')
+        SnapshotBackup(self.backup_seed).snapshot(self.stored)
+        self.analytics_seed = os.path.join(work_dir, 'analytics_seed')
+        AnalyticsTables(self.analytics_seed).rebuild(self.stored)
+
+    def path(self, name):
+        return os.path.join(self.work_dir, name)
+
+    def fresh_copy(self, source, name):
+        """Copy a seed file or folder to name, replacing the previous copy"""
+        target = self.path(name)
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        if os.path.isdir(source):
+            shutil.copytree(source, target)
+        else:
+            shutil.copy2(source, target)
+        return target
+
+
+def stage_parse(case):
+    return None, lambda: case.downloader.parse_csv_data(case.csv_path)
+
+
+def stage_fingerprint(case):
+    return None, lambda: fingerprint_dates(case.df_new)
+
+
+def stage_validate(case):
+    return None, lambda: check_blocks(case.df_new)
+
+
+def stage_read_history(case):
+    return None, lambda: read_history(case.excel_path)
+
+
+def stage_merge(case):
+    return None, lambda: upsert_positions(case.stored, case.df_new)
+
+
+def stage_excel_update(case):
+    def setup():
+        case.fresh_copy(case.excel_path, 'work.xlsx')
+    return setup, lambda: case.downloader.update_excel(case.df_new, case.path('work.xlsx'))
+
+
+def stage_excel_full(case):
+    return None, lambda: write_data_sheet(case.history, case.path('full.xlsx'))
+
+
+def stage_backup_copy(case):
+    def setup():
+        shutil.rmtree(case.path('Save'), ignore_errors=True)
+    return setup, lambda: case.downloader.backup_excel(case.excel_path)
+
+
+def stage_backup_snapshot(case):
+    def setup():
+        case.fresh_copy(case.backup_seed, 'backup')
+    return setup, lambda: SnapshotBackup(case.path('backup')).snapshot_update(case.df_new, lambda: case.history)
+
+
+def stage_analytics(case):
+    def setup():
+        case.fresh_copy(case.analytics_seed, 'analytics')
+    return setup, lambda: AnalyticsTables(case.path('analytics')).update(case.df_new, lambda: case.history)
+
+
+STAGES = {
+    'parse': stage_parse,
+    'fingerprint': stage_fingerprint,
+    'validate': stage_validate,
+    'read_history': stage_read_history,
+    'merge': stage_merge,
+    'excel_update': stage_excel_update,
+    'excel_full': stage_excel_full,
+    'backup_copy': stage_backup_copy,
+    'backup_snapshot': stage_backup_snapshot,
+    'analytics': stage_analytics,
+}
+
+
+def measure(func, setup=None, repeat=3):
+    """Return (best seconds, peak MiB) of func(), memory traced in a separate run"""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    if setup:
+        setup()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def regressions(result, baseline, threshold, memory_threshold):
+    """Return the regression flags of one result against its baseline entry"""
+    if not baseline:
+        return []
+    flags = []
+    if (result['seconds'] > baseline['seconds'] * threshold
+            and result['seconds'] - baseline['seconds'] > MIN_SECONDS):
+        flags.append(f"time x{result['seconds'] / baseline['seconds']:.2f}")
+    if (result['peak_mib'] > baseline['peak_mib'] * memory_threshold
+            and result['peak_mib'] - baseline['peak_mib'] > MIN_MIB):
+        flags.append(f"memory x{result['peak_mib'] / baseline['peak_mib']:.2f}")
+    return flags
+
+
+def parse_sizes(text):
+    sizes = []
+    for size in text.split(','):
+        n_positions, n_dates = size.lower().split('x')
+        sizes.append((int(n_positions), int(n_dates)))
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and peak memory of every stage of a run")
+    parser.add_argument('--sizes', default='10x1,50x250,100x1000', type=parse_sizes,
+                        help="comma-separated POSITIONSxDATES of the stored history (up to 500x10000)")
+    parser.add_argument('--stages', default=','.join(STAGES), help="comma-separated stages to run")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage, the best is kept")
+    parser.add_argument('--baseline', help="JSON results to compare with (flags regressions)")
+    parser.add_argument('--save-baseline', metavar='FILE', help="write the results to FILE")
+    parser.add_argument('--threshold', type=float, default=1.5, help="time ratio flagged as a regression")
+    parser.add_argument('--memory-threshold', type=float, default=1.2, help="memory ratio flagged as a regression")
+    args = parser.parse_args()
+
+    stages = args.stages.split(',')
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {unknown} (available: {', '.join(STAGES)})")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = {}
+    flagged = []
+    print(f"{'stage':<18} {'size':>10} {'time (ms)':>10} {'peak MiB':>9}  flags")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # backup_excel writes to Save/ in the working directory
+        os.chdir(tmp_dir)
+        try:
+            for n_positions, n_dates in args.sizes:
+                case = Case(tmp_dir, n_positions, n_dates)
+                size = f'{n_positions}x{n_dates}'
+                for stage in stages:
+                    setup, func = STAGES[stage](case)
+                    seconds, peak = measure(func, setup, args.repeat)
+                    key = f'{stage}@{size}'
+                    results[key] = {'seconds': seconds, 'peak_mib': peak}
+                    flags = regressions(results[key], baseline.get(key),
+                                        args.threshold, args.memory_threshold)
+                    if flags:
+                        flagged.append(key)
+                    print(f"{stage:<18} {size:>10} {seconds * 1000:>10.1f} {peak:>9.1f}  {', '.join(flags)}")
+        finally:
+            os.chdir(cwd)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print(f"Results saved to {args.save_baseline}")
+
+    if flagged:
+        print(f"REGRESSION: {', '.join(flagged)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Synthetic EasyBourse data: exports in the exact CSV format and history workbooks of any size
+
+Usage: python benchmarks/synthetic.py OUTPUT_DIR [positions] [dates]
+Writes OUTPUT_DIR/EasyBourse.xlsx with the history and OUTPUT_DIR/exports/ with one export per date.
+"""
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from easybourse_excel import write_data_sheet
+from easybourse_quality import valid_isins
+
+PLACES = ['EURONEXT PARIS', 'NASDAQ', 'NYSE', 'XETRA', 'EURONEXT AMSTERDAM']
+
+EXPORT_HEADER = ('Valeur;Code Isin;Place de cotation;Position;Quantité;Cours;Prix moyen;Valorisation;'
+                 '+/- value;Performance (%);Poids')
+
+
+def make_isins(n_positions):
+    """Return n_positions distinct French ISINs with a valid check digit"""
+    bodies = [f'FR{i:09d}' for i in range(n_positions)]
+    candidates = [body + str(digit) for body in bodies for digit in range(10)]
+    check_digits = valid_isins(candidates).reshape(-1, 10).argmax(axis=1)
+    return [body + str(digit) for body, digit in zip(bodies, check_digits)]
+
+
+def build_history(n_dates, n_positions, start='2000-01-03', seed=0):
+    """Build a history of n_dates business days with n_positions positions each
+
+    Prices follow a random walk, quantities and average prices are fixed and
+    every derived column (Valorisation, +/- value, Poids, totals) is consistent.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, periods=n_dates)
+
+    quantities = rng.integers(1, 500, n_positions)
+    average_prices = rng.uniform(5, 500, n_positions).round(3)
+    returns = rng.normal(0, 0.015, (n_dates, n_positions))
+    prices = (average_prices * np.exp(np.cumsum(returns, axis=0))).round(2).ravel()
+
+    quantity = np.tile(quantities, n_dates)
+    average_price = np.tile(average_prices, n_dates)
+    valorisation = (quantity * prices).round(2)
+    df = pd.DataFrame({
+        'Valeur': np.tile([f'VALEUR {i:04d}' for i in range(n_positions)], n_dates),
+        'Code Isin': np.tile(make_isins(n_positions), n_dates),
+        'Place de cotation': np.tile([PLACES[i % len(PLACES)] for i in range(n_positions)], n_dates),
+        'Position': 'Sous dossier',
+        'Quantité': quantity,
+        'Cours': prices,
+        'Prix moyen': average_price,
+        'Valorisation': valorisation,
+        '+/- value': ((prices - average_price) * quantity).round(2),
+        'Performance (%)': ((prices / average_price - 1) * 100).round(2),
+        'Date': np.repeat(dates, n_positions),
+    })
+
+    # Totals of each date, repeated on its rows
+    positions_total = df.groupby('Date')['Valorisation'].transform('sum').round(2)
+    cash = np.repeat(rng.uniform(1_000, 50_000, n_dates).round(2), n_positions)
+    df['Poids'] = (df['Valorisation'] / (positions_total + cash) * 100).round(2)
+    df['Valeur totale'] = (positions_total + cash).round(2)
+    df['Total positions sous dossier'] = positions_total
+    df['Solde espèces'] = cash
+    return df
+
+
+def _french(values, decimals=2):
+    """Format numbers as in the export: space thousands separator, comma decimal separator"""
+    return [f'{value:,.{decimals}f}'.replace(',', ' ').replace('.', ',') for value in values]
+
+
+def format_export(block):
+    """Return the bytes of the export of one date block, as downloaded from EasyBourse"""
+    first = block.iloc[0]
+    lines = [
+        'Compte;12345678', '',
+        f"Valorisation au;{pd.Timestamp(first['Date']).strftime('%d/%m/%Y')}", '',
+        'Dossier;PEA', '', '',
+        f"Total positions sous dossier;{_french([first['Total positions sous dossier']])[0]}",
+        f"Solde espèces;{_french([first['Solde espèces']])[0]}",
+        f"Valeur totale;{_french([first['Valeur totale']])[0]}",
+        '', '', '', '',
+        EXPORT_HEADER,
+    ]
+    columns = [
+        block['Valeur'], block['Code Isin'], block['Place de cotation'], block['Position'],
+        block['Quantité'].astype(int).astype(str), _french(block['Cours']), _french(block['Prix moyen'], 3),
+        _french(block['Valorisation']), _french(block['+/- value']),
+        [f'{value}%' for value in _french(block['Performance (%)'])], _french(block['Poids']),
+    ]
+    lines += [';'.join(values) for values in zip(*columns)]
+    return '\r\n'.join(lines + ['']).encode('cp1252')
+
+
+def write_export_csv(path, n_positions, date='2025-08-06', seed=0):
+    """Write one export with n_positions rows valued at date"""
+    block = build_history(1, n_positions, start=date, seed=seed)
+    with open(path, 'wb') as f:
+        f.write(format_export(block))
+    return path
+
+
+def write_exports(directory, history):
+    """Write one export per date of history, named like the downloaded files"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for date, block in history.groupby('Date', sort=True):
+        path = os.path.join(directory, f"valorisation_{pd.Timestamp(date).strftime('%Y%m%d')}.csv")
+        with open(path, 'wb') as f:
+            f.write(format_export(block))
+        paths.append(path)
+    return paths
+
+
+def write_history_workbook(path, n_dates, n_positions, normalized=False, seed=0):
+    """Write a history workbook of n_dates x n_positions rows, returns the history"""
+    history = build_history(n_dates, n_positions, seed=seed)
+    write_data_sheet(history, path, normalized=normalized)
+    return history
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    output_dir = sys.argv[1]
+    n_positions = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    n_dates = int(sys.argv[3]) if len(sys.argv) > 3 else 250
+
+    os.makedirs(output_dir, exist_ok=True)
+    history = write_history_workbook(os.path.join(output_dir, 'EasyBourse.xlsx'), n_dates, n_positions)
+    write_exports(os.path.join(output_dir, 'exports'), history)
+    print(f"{len(history)} rows ({n_dates} dates x {n_positions} positions) written to {output_dir}")
+
+
+if __name__ == '__main__':
+    main()
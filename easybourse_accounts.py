@@ -0,0 +1,126 @@
+import logging
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from easybourse_history import ACCOUNT_COLUMN
+
+logger = logging.getLogger(__name__)
+
+# Downloader settings passed on to the workers of run_accounts
+FETCH_OPTIONS = ['timeouts', 'download_mode', 'base_url', 'lean_profile', 'blocked_urls']
+
+
+def fetch_account(name, username, password, work_dir, options=None, downloader_class=None):
+    """Worker: fetch one account with its own download directory and browser profile
+
+    Returns the parsed DataFrame with an account column, or None on failure.
+    """
+    if downloader_class is None:
+        from easybourse_valorisation import EasyBourseValorisationDownloader as downloader_class
+
+    download_dir = os.path.join(work_dir, name, 'downloads')
+    profile_dir = os.path.join(work_dir, name, 'profile')
+    os.makedirs(download_dir, exist_ok=True)
+    os.makedirs(profile_dir, exist_ok=True)
+
+    downloader = downloader_class(username, password, download_dir=download_dir, profile_dir=profile_dir,
+                                  **(options or {}))
+    driver = downloader.setup_driver()
+    try:
+        if not downloader.login(driver):
+            logger.error(f"[{name}] Login failed")
+            return None
+        df, _ = downloader.fetch(driver)
+        if df is None:
+            return None
+        df[ACCOUNT_COLUMN] = name
+        return df
+    finally:
+        driver.quit()
+
+
+def fetch_accounts(accounts, max_workers=None, work_dir=None, options=None, downloader_class=None):
+    """Fetch several accounts in parallel, one process per account
+
+    accounts is a list of dicts with 'name', 'id' and 'password' keys. Returns the
+    parsed positions of every successful account concatenated, or None if all failed.
+    Each worker builds a downloader_class (the EasyBourse downloader by default) with options.
+    """
+    names = [account['name'] for account in accounts]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Account names must be unique: {names}")
+
+    own_work_dir = work_dir is None
+    if own_work_dir:
+        work_dir = tempfile.mkdtemp(prefix='easybourse_accounts_')
+
+    frames = []
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers or len(accounts)) as pool:
+            futures = {
+                pool.submit(fetch_account, account['name'], account['id'], account['password'], work_dir, options,
+                            downloader_class): account['name']
+                for account in accounts
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    df = future.result()
+                except Exception as e:
+                    logger.error(f"[{name}] Fetch error: {e}")
+                    continue
+                if df is None:
+                    logger.error(f"[{name}] No data fetched")
+                else:
+                    logger.info(f"[{name}] {len(df)} positions fetched")
+                    frames.append(df)
+    finally:
+        if own_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True)
+
+
+def unassigned_dates(history, df):
+    """Return the valuation dates of df for which history holds positions without account"""
+    if len(history) == 0:
+        return []
+    dates = pd.to_datetime(history['Date'])
+    unassigned = dates.isin(pd.to_datetime(df['Date']).unique())
+    if ACCOUNT_COLUMN in history.columns:
+        accounts = history[ACCOUNT_COLUMN].astype('object')
+        unassigned &= accounts.isna() | (accounts.astype(str).str.strip() == '')
+    return sorted(dates[unassigned].unique())
+
+
+def run_accounts(downloader, accounts, excel_path=None, max_workers=None, options=None, work_dir=None):
+    """Fetch every account in parallel and merge them into one history with an account column
+
+    The workers use the class and the fetch settings (FETCH_OPTIONS, overridden by options)
+    of downloader, which merges their positions.
+    """
+    excel_path = os.path.abspath(excel_path or 'EasyBourse.xlsx')
+    options = {**{name: getattr(downloader, name) for name in FETCH_OPTIONS}, **(options or {})}
+    df = fetch_accounts(accounts, max_workers=max_workers, work_dir=work_dir, options=options,
+                        downloader_class=type(downloader))
+    if df is None:
+        logger.error("No account could be fetched")
+        return False
+
+    # Positions stored without account (single-account runs) would be counted next to the accounts' ones
+    history = None
+    if os.path.exists(downloader.history_store or excel_path):
+        history = downloader.load_history(excel_path)
+        unassigned = unassigned_dates(history, df)
+        if unassigned:
+            logger.error(f"{', '.join(f'{date:%d/%m/%Y}' for date in unassigned)} already stored without account: "
+                         f"restore the history from before (backup --restore) or fetch the accounts the next day")
+            return False
+
+    return downloader.save_history(df, excel_path, None if downloader.history_store else history)
@@ -0,0 +1,260 @@
+import io
+import json
+import logging
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from easybourse_history import ACCOUNT_COLUMN, TOTAL_COLUMNS, position_keys, split_totals, upsert_positions
+
+logger = logging.getLogger(__name__)
+
+# Number of valuation dates in the rolling volatility window
+VOLATILITY_WINDOW = 20
+
+# Valuation dates per year, to annualize the volatility
+DATES_PER_YEAR = 252
+
+PORTFOLIO_COLUMNS = ['Date'] + TOTAL_COLUMNS + ['Daily return (%)', 'Cumulative return (%)', 'Peak',
+                                                 'Drawdown (%)', 'Volatility (%)']
+
+# Position columns copied from the history to the Positions sheet
+POSITION_COLUMNS = ['Valeur', 'Code Isin', 'Quantité', 'Cours', 'Valorisation', '+/- value', 'Poids']
+
+
+def analytics_dir(excel_path):
+    """Return the analytics folder stored next to the history"""
+    return os.path.splitext(excel_path)[0] + '_Analytics'
+
+
+def daily_totals(df):
+    """Return one totals row per date, summing the accounts when there are several"""
+    totals = split_totals(df)[1]
+    totals['Date'] = pd.to_datetime(totals['Date'])
+    total_columns = [c for c in TOTAL_COLUMNS if c in totals.columns]
+    totals[total_columns] = totals[total_columns].apply(pd.to_numeric, errors='coerce')
+    return totals.groupby('Date', sort=True)[total_columns].sum(min_count=1).reset_index()
+
+
+def portfolio_series(totals, previous=None, window=VOLATILITY_WINDOW):
+    """Compute the Portfolio rows of totals (one row per date), continuing the previous rows
+
+    Only the last window rows of previous are needed for the volatility, its
+    first value for the cumulative return and its last peak for the drawdown.
+    """
+    df = totals.sort_values('Date').reset_index(drop=True)
+    df = df.reindex(columns=['Date'] + TOTAL_COLUMNS)
+    value = pd.to_numeric(df['Valeur totale'], errors='coerce').astype(float)
+
+    if previous is not None and len(previous) > 0:
+        previous = previous.sort_values('Date')
+        previous_values = pd.to_numeric(previous['Valeur totale'], errors='coerce').astype(float)
+        previous_returns = pd.to_numeric(previous['Daily return (%)'], errors='coerce').astype(float)
+        base = previous_values.iloc[0]
+        peak = pd.to_numeric(previous['Peak'], errors='coerce').astype(float).iloc[-1]
+        last_value = previous_values.iloc[-1]
+        previous_returns = previous_returns.iloc[-(window - 1):] if window > 1 else previous_returns.iloc[:0]
+    else:
+        base = value.iloc[0]
+        peak = np.nan
+        last_value = np.nan
+        previous_returns = pd.Series(dtype=float)
+
+    # Daily returns, continuing from the last stored value
+    values = np.concatenate([[last_value], value.to_numpy()])
+    df['Daily return (%)'] = (values[1:] / values[:-1] - 1) * 100
+    df['Cumulative return (%)'] = (value / base - 1) * 100
+    df['Peak'] = np.fmax.accumulate(np.concatenate([[peak], value.to_numpy()]))[1:]
+    df['Drawdown (%)'] = (value / df['Peak'] - 1) * 100
+
+    # Rolling volatility over the stored and new returns
+    returns = pd.concat([previous_returns, df['Daily return (%)']], ignore_index=True)
+    volatility = returns.rolling(window, min_periods=2).std() * math.sqrt(DATES_PER_YEAR)
+    df['Volatility (%)'] = volatility.iloc[-len(df):].to_numpy()
+    return df[PORTFOLIO_COLUMNS]
+
+
+def position_history(positions, previous=None):
+    """Compute the Positions rows of positions, continuing the previous date block
+
+    Each position is compared to the same position (ISIN, or name) at the
+    previous valuation date: daily P&L on the previous quantity and daily return.
+    """
+    columns = ['Date'] + [c for c in [ACCOUNT_COLUMN] + POSITION_COLUMNS if c in positions.columns]
+    frames = [positions[columns]]
+    if previous is not None and len(previous) > 0:
+        frames.insert(0, previous.reindex(columns=columns))
+    df = pd.concat(frames, ignore_index=True)
+    df['Date'] = pd.to_datetime(df['Date'])
+    for col in ('Quantité', 'Cours', 'Valorisation'):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Match every row with the same position at the previous date
+    with_account = ACCOUNT_COLUMN in df.columns
+    keys = position_keys(df, with_account)
+    dates = np.sort(df['Date'].unique())
+    prior_index = np.searchsorted(dates, df['Date'].to_numpy()) - 1
+    prior_date = pd.Series(dates[np.maximum(prior_index, 0)]).where(prior_index >= 0)
+    current = pd.DataFrame({'Date': prior_date, 'key': keys})
+    prior = pd.DataFrame({'Date': df['Date'], 'key': keys, 'Cours': df['Cours'], 'Quantité': df['Quantité']})
+    prior = prior.drop_duplicates(['Date', 'key'])
+    matched = current.merge(prior, on=['Date', 'key'], how='left')
+
+    df['Daily P&L'] = (df['Cours'] - matched['Cours'].to_numpy()) * matched['Quantité'].to_numpy()
+    df['Daily return (%)'] = (df['Cours'] / matched['Cours'].to_numpy() - 1) * 100
+
+    # Weight among the positions of the date (and account), cash excluded
+    group = [df['Date'], df[ACCOUNT_COLUMN]] if with_account else [df['Date']]
+    invested = df.groupby(group, dropna=False)['Valorisation'].transform('sum')
+    df['Weight (%)'] = df['Valorisation'] / invested * 100
+
+    new_dates = pd.to_datetime(positions['Date']).unique()
+    return df[df['Date'].isin(new_dates)].reset_index(drop=True)
+
+
+def build_analytics(history, window=VOLATILITY_WINDOW):
+    """Compute the Portfolio and Positions tables over the whole history"""
+    history = history.loc[:, ~history.columns.astype(str).str.contains('Unnamed')]
+    history = history.assign(Date=pd.to_datetime(history['Date'])).sort_values('Date', kind='mergesort')
+    return portfolio_series(daily_totals(history), window=window), position_history(history)
+
+
+def _date_key(date):
+    return pd.Timestamp(date).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class AnalyticsTables:
+    """Portfolio.csv and Positions.csv, appended one date block at a time
+
+    index.json holds the byte offset of every date block of each table, so a
+    run that adds or replaces the last date rewrites only that block and reads
+    back only the state it needs: the Portfolio rows (one per date) and the
+    previous date block of Positions.
+    """
+
+    TABLES = ('Portfolio', 'Positions')
+
+    def __init__(self, directory, window=VOLATILITY_WINDOW):
+        self.directory = directory
+        self.window = window
+        self.index_path = os.path.join(directory, 'index.json')
+
+    def _table_path(self, table):
+        return os.path.join(self.directory, f'{table}.csv')
+
+    def load_index(self):
+        """Return the index, or None when it is missing or does not match the tables"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if all(os.path.getsize(self._table_path(t)) == index['sizes'][t] for t in self.TABLES):
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def _save_index(self, index):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _read_block(self, table, index, i):
+        """Read the i-th date block of a table"""
+        offsets = index['offsets'][table]
+        with open(self._table_path(table), 'rb') as f:
+            f.seek(offsets[i])
+            data = f.read(offsets[i + 1] - offsets[i]) if i + 1 < len(offsets) else f.read()
+        return pd.read_csv(io.BytesIO(data), header=None, names=index['columns'][table], parse_dates=['Date'])
+
+    @staticmethod
+    def _encode(df):
+        return df.to_csv(index=False, header=False, date_format='%Y-%m-%d %H:%M:%S',
+                         lineterminator='\n').encode('utf-8')
+
+    def rebuild(self, history):
+        """Recompute both tables over the whole history and rewrite them, returns the position rows"""
+        os.makedirs(self.directory, exist_ok=True)
+        tables = dict(zip(self.TABLES, build_analytics(history, self.window)))
+        index = {'dates': [_date_key(d) for d in tables['Portfolio']['Date']],
+                 'columns': {}, 'offsets': {}, 'sizes': {}}
+
+        for table, df in tables.items():
+            header = (','.join(df.columns) + '\n').encode('utf-8')
+            data = self._encode(df)
+
+            # A block starts after the line ending the last row of the previous date
+            line_ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n'))
+            starts = np.concatenate([[0], line_ends[:-1] + 1]) + len(header)
+            first_rows = np.flatnonzero(~df['Date'].duplicated().to_numpy())
+
+            path = self._table_path(table)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(header + data)
+            os.replace(path + '.tmp', path)
+            index['columns'][table] = list(df.columns)
+            index['offsets'][table] = starts[first_rows].tolist()
+            index['sizes'][table] = len(header) + len(data)
+
+        self._save_index(index)
+        logger.info(f"📈 Analytics rebuilt: {self.directory} ({len(index['dates'])} dates)")
+        return len(tables['Positions'])
+
+    def append(self, df_new):
+        """Add or replace the last date with the single date of df_new, None when a rebuild is needed"""
+        index = self.load_index()
+        df_new = df_new.copy()
+        df_new['Date'] = pd.to_datetime(df_new['Date'])
+        if index is None or not index['dates'] or df_new['Date'].nunique() != 1:
+            return None
+        date = df_new['Date'].iloc[0]
+        key = _date_key(date)
+        if key < index['dates'][-1]:
+            return None
+        replace = key == index['dates'][-1]
+
+        # State: earlier Portfolio rows and the Positions block of the previous date
+        portfolio = pd.read_csv(self._table_path('Portfolio'), parse_dates=['Date'])
+        previous_i = len(index['dates']) - (2 if replace else 1)
+        previous_positions = self._read_block('Positions', index, previous_i) if previous_i >= 0 else None
+        blocks = {
+            'Portfolio': portfolio_series(daily_totals(df_new), portfolio[portfolio['Date'] < date], self.window),
+            'Positions': position_history(df_new, previous_positions),
+        }
+        if any(c not in index['columns'][table] for table, df in blocks.items() for c in df.columns):
+            return None
+        if replace:
+            # Positions missing from the new export stay in the history, as in Data
+            last_block = self._read_block('Positions', index, len(index['dates']) - 1)
+            blocks['Positions'] = upsert_positions(last_block, blocks['Positions'])[0]
+        blocks = {table: df.reindex(columns=index['columns'][table]) for table, df in blocks.items()}
+
+        for table, df in blocks.items():
+            offset = index['offsets'][table][-1] if replace else index['sizes'][table]
+            with open(self._table_path(table), 'r+b') as f:
+                f.seek(offset)
+                f.truncate()
+                f.write(self._encode(df))
+                index['sizes'][table] = f.tell()
+            if not replace:
+                index['offsets'][table].append(offset)
+        if not replace:
+            index['dates'].append(key)
+        self._save_index(index)
+        return len(blocks['Positions'])
+
+    def update(self, df_new, load_history):
+        """Update the tables with the dates of df_new
+
+        A single date later than, or equal to, the last analytics date is
+        computed from the stored state; otherwise the whole history
+        (load_history()) is recomputed.
+        """
+        rows = self.append(df_new)
+        if rows is not None:
+            logger.info(f"📈 Analytics updated: {rows} position rows")
+            return rows
+        return self.rebuild(load_history())
@@ -0,0 +1,59 @@
+import glob
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# Parser instance of the worker process
+_parser = None
+
+
+def parse_export(csv_path):
+    """Worker: parse one archived export, returns the DataFrame or None"""
+    global _parser
+    if _parser is None:
+        from easybourse_valorisation import EasyBourseValorisationDownloader
+
+        # Per-file INFO lines would flood the console
+        logging.getLogger('easybourse_valorisation').setLevel(logging.WARNING)
+        _parser = EasyBourseValorisationDownloader(None, None)
+    return _parser.parse_csv_data(csv_path)
+
+
+def load_exports(source_dir, pattern='*.csv', max_workers=None):
+    """Parse every export of source_dir in parallel, keeping the latest file of each valuation date"""
+    paths = sorted(glob.glob(os.path.join(source_dir, pattern)), key=os.path.getmtime)
+    if not paths:
+        logger.warning(f"No export found in {source_dir}")
+        return None
+    logger.info(f"📂 Parsing {len(paths)} exports from {source_dir}...")
+
+    frames = {}
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(paths) // (4 * workers))
+        for path, df in zip(paths, pool.map(parse_export, paths, chunksize=chunksize)):
+            if df is None or len(df) == 0:
+                logger.warning(f"Skipping unreadable export: {path}")
+                continue
+            # Files are in modification order, a later export of the same date replaces an earlier one
+            frames[pd.Timestamp(df['Date'].iloc[0])] = df
+
+    if not frames:
+        return None
+    logger.info(f"📅 {len(frames)} valuation dates from {len(paths)} exports")
+    return pd.concat([frames[date] for date in sorted(frames)], ignore_index=True)
+
+
+def backfill(downloader, source_dir, excel_path=None, pattern='*.csv', max_workers=None):
+    """Load a directory of archived exports into the history in a single write"""
+    excel_path = os.path.abspath(excel_path or 'EasyBourse.xlsx')
+    df = load_exports(source_dir, pattern=pattern, max_workers=max_workers)
+    if df is None:
+        return False
+
+    return downloader.save_history(df, excel_path)
@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from easybourse_history import fingerprint_dates, upsert_positions
+
+logger = logging.getLogger(__name__)
+
+# Keep every snapshot for a day, then one per day for a month, then one per week for a year
+DEFAULT_RETENTION = {'all': timedelta(days=1), 'daily': timedelta(days=30), 'weekly': timedelta(weeks=52)}
+
+BLOCK_SUFFIX = '.parquet'
+
+
+def backup_dir(excel_path):
+    """Return the backup folder stored next to the history"""
+    return os.path.splitext(excel_path)[0] + '_Backup'
+
+
+class SnapshotBackup:
+    """Content-addressed, compressed backups of the history, one Parquet file per distinct date block
+
+    The manifest lists snapshots in time order; each snapshot only records the
+    date blocks that changed since the previous one ({date: block hash}), so a
+    run that touches one date stores one small block. Restoring replays the
+    snapshots up to the requested time.
+    """
+
+    def __init__(self, backup_dir, retention=None):
+        self.backup_dir = backup_dir
+        self.blocks_dir = os.path.join(backup_dir, 'blocks')
+        self.manifest_path = os.path.join(backup_dir, 'manifest.json')
+        self.retention = retention or DEFAULT_RETENTION
+
+    def load_manifest(self):
+        """Return the list of snapshots ({'time', 'changes'}), oldest first"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)['snapshots']
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def _save_manifest(self, snapshots):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'snapshots': snapshots}, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _block_path(self, block_hash):
+        return os.path.join(self.blocks_dir, block_hash + BLOCK_SUFFIX)
+
+    def state(self, until=None):
+        """Return {date: block hash} of the history as of until (latest if None)"""
+        blocks = {}
+        for snapshot in self.load_manifest():
+            if until is not None and datetime.fromisoformat(snapshot['time']) > until:
+                break
+            blocks.update(snapshot['changes'])
+        return {date: block_hash for date, block_hash in blocks.items() if block_hash}
+
+    def load_block(self, date_key, block_hash):
+        """Load a date block; identical blocks of different dates share one file, so the date is set here"""
+        block = pd.read_parquet(self._block_path(block_hash))
+        block['Date'] = pd.Timestamp(date_key)
+        return block
+
+    def snapshot(self, df, now=None, complete=False):
+        """Store the date blocks of df that differ from the latest snapshot, returns the number of changes
+
+        With complete, df is the whole history: dates of the latest snapshot missing
+        from it are recorded as removed (empty hash), e.g. after a restore.
+        """
+        os.makedirs(self.blocks_dir, exist_ok=True)
+        current = self.state()
+        changes = {}
+        dates = pd.to_datetime(df['Date'])
+        fingerprints = fingerprint_dates(df)
+        if complete:
+            changes.update({date_key: '' for date_key in current if date_key not in fingerprints})
+        for date_key, block_hash in fingerprints.items():
+            if current.get(date_key) == block_hash:
+                continue
+            path = self._block_path(block_hash)
+            if not os.path.exists(path):
+                block = df[dates == pd.Timestamp(date_key)].reset_index(drop=True)
+                block.to_parquet(path + '.tmp', index=False, compression='zstd')
+                os.replace(path + '.tmp', path)
+            changes[date_key] = block_hash
+
+        if changes:
+            snapshots = self.load_manifest()
+            snapshots.append({'time': (now or datetime.now()).isoformat(timespec='seconds'), 'changes': changes})
+            self._save_manifest(snapshots)
+            logger.info(f"Backup snapshot created: {len(changes)} date blocks")
+            self.prune(now)
+        return len(changes)
+
+    def snapshot_update(self, df_new, load_history, now=None):
+        """Snapshot the history after df_new was merged into it
+
+        Without any snapshot yet, the whole history (load_history()) is stored; later
+        snapshots rebuild only the merged blocks of the dates of df_new from the backup itself.
+        The history before its first update is backed up by snapshot() before that update.
+        """
+        current = self.state()
+        if not current:
+            return self.snapshot(load_history(), now)
+
+        merged = []
+        new_dates = pd.to_datetime(df_new['Date'])
+        for date_key in fingerprint_dates(df_new):
+            block = df_new[new_dates == pd.Timestamp(date_key)]
+            existing = self.load_block(date_key, current[date_key]) if date_key in current else None
+            merged.append(upsert_positions(existing, block)[0])
+        return self.snapshot(pd.concat(merged, ignore_index=True), now)
+
+    def restore(self, until=None):
+        """Return the history as of until (latest if None), or None if there is no backup"""
+        state = self.state(until)
+        if not state:
+            return None
+        frames = [self.load_block(date, state[date]) for date in sorted(state)]
+        return pd.concat(frames, ignore_index=True)
+
+    def prune(self, now=None):
+        """Apply the retention policy, folding removed snapshots into the next kept one"""
+        now = now or datetime.now()
+        snapshots = self.load_manifest()
+        kept_buckets = set()
+        keep = [False] * len(snapshots)
+
+        # Walk from newest to oldest, keeping the newest snapshot of each bucket
+        for i in range(len(snapshots) - 1, -1, -1):
+            time = datetime.fromisoformat(snapshots[i]['time'])
+            age = now - time
+            if i == len(snapshots) - 1 or age <= self.retention['all']:
+                bucket = ('all', i)
+            elif age <= self.retention['daily']:
+                bucket = ('daily', time.date())
+            elif age <= self.retention['weekly']:
+                bucket = ('weekly',) + tuple(time.isocalendar()[:2])
+            else:
+                continue
+            if bucket not in kept_buckets:
+                kept_buckets.add(bucket)
+                keep[i] = True
+
+        if all(keep):
+            return 0
+
+        # Changes of a removed snapshot are carried by the next kept one
+        pruned = []
+        pending = {}
+        for snapshot, kept in zip(snapshots, keep):
+            pending.update(snapshot['changes'])
+            if kept:
+                pruned.append({'time': snapshot['time'], 'changes': pending})
+                pending = {}
+        self._save_manifest(pruned)
+
+        # Delete blocks no longer referenced
+        referenced = {h for snapshot in pruned for h in snapshot['changes'].values() if h}
+        for filename in os.listdir(self.blocks_dir):
+            if filename.endswith(BLOCK_SUFFIX) and filename[:-len(BLOCK_SUFFIX)] not in referenced:
+                os.remove(os.path.join(self.blocks_dir, filename))
+
+        removed = len(snapshots) - len(pruned)
+        logger.info(f"Old backup snapshots removed: {removed}")
+        return removed
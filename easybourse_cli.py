@@ -0,0 +1,299 @@
+"""Command line: fetch, parse, merge, backup, export and run
+
+Only argparse is imported here; pandas, Selenium and the history modules are
+imported by the commands that use them, and logins.py only by fetch and run.
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Optional history store: None (Excel only), a folder (Parquet) or a .db file (SQLite)
+HISTORY_STORE = None
+
+COMMANDS = ['fetch', 'parse', 'merge', 'backup', 'export', 'run']
+
+NO_EXPORT_HELP = "with --store: do not export the workbook after each update, leave it to the export command"
+
+# Former flags of easybourse_valorisation.py that became options of another command
+LEGACY_FLAGS = {
+    '--list-backups': ('backup', '--list'),
+    '--restore': ('backup', '--restore'),
+    '--migrate-layout': ('export', '--layout'),
+}
+
+
+def load_credentials():
+    """Return (id, password) from logins.py, exit when it is missing"""
+    try:
+        from logins import id, password
+    except ImportError:
+        sys.exit("logins.py not found: create it with your id and password (see the README)")
+    return id, password
+
+
+def load_accounts():
+    """Return the accounts list of logins.py, exit when it is missing"""
+    try:
+        from logins import accounts
+    except ImportError:
+        sys.exit("No accounts in logins.py: add the accounts list to use --accounts (see the README)")
+    return accounts
+
+
+def make_downloader(args, username=None, password=None, **options):
+    """Return a downloader configured from the common options"""
+    from easybourse_valorisation import EasyBourseValorisationDownloader
+
+    return EasyBourseValorisationDownloader(username, password, history_store=getattr(args, 'store', None),
+                                            profile_dir=getattr(args, 'profile_dir', None),
+                                            lean_profile=getattr(args, 'lean_profile', False),
+                                            export_excel=not getattr(args, 'no_export', False), **options)
+
+
+def cmd_fetch(args):
+    """Log in, download the export and keep it as a CSV file"""
+    downloader = make_downloader(args, *load_credentials())
+    try:
+        driver = downloader.setup_driver()
+    except Exception:
+        # Already logged by setup_driver
+        return 1
+    try:
+        if not downloader.login(driver):
+            logger.error("Login failed")
+            return 1
+        csv_data, csv_path = downloader.download(driver)
+    finally:
+        driver.quit()
+    if csv_data is None and csv_path is None:
+        return 1
+
+    output = os.path.abspath(args.output or csv_path
+                             or f"valorisation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    if csv_data is not None:
+        with open(output, 'wb') as f:
+            f.write(csv_data)
+    elif output != csv_path:
+        os.replace(csv_path, output)
+    logger.info(f"✅ Export saved: {output}")
+    return 0
+
+
+def cmd_parse(args):
+    """Parse an export and print its positions and totals, or write them to a CSV file"""
+    from easybourse_history import TOTAL_COLUMNS
+
+    df = make_downloader(args).parse_csv_data(args.csv)
+    if df is None:
+        return 1
+    if args.output:
+        df.to_csv(args.output, index=False)
+        logger.info(f"✅ {len(df)} positions written to {args.output}")
+    elif len(df) > 0:
+        # An export may lack some totals (e.g. 'Valeur totale;N/D')
+        totals = [column for column in TOTAL_COLUMNS if column in df.columns]
+        print(df.drop(columns=totals + ['Date']).to_string(index=False))
+        first = df.iloc[0]
+        print(f"\nValuation of {first['Date']:%d/%m/%Y}: "
+              + ', '.join(f"{column} {first[column]}" for column in totals))
+    return 0
+
+
+def cmd_merge(args):
+    """Merge an export into the history, offline"""
+    from easybourse_history import fingerprint_dates, fingerprints_path, save_fingerprints
+
+    downloader = make_downloader(args)
+    excel_path = os.path.abspath(args.xlsx)
+    df = downloader.parse_csv_data(args.csv)
+    if df is None:
+        return 1
+    if not downloader.save_history(df, excel_path):
+        return 1
+    save_fingerprints(fingerprints_path(excel_path), fingerprint_dates(df))
+    return 0
+
+
+def cmd_backup(args):
+    """Snapshot the history, list the snapshots or restore one"""
+    from easybourse_backup import SnapshotBackup, backup_dir
+
+    downloader = make_downloader(args)
+    excel_path = os.path.abspath(args.excel)
+    snapshot_backup = SnapshotBackup(backup_dir(excel_path))
+    if args.list:
+        for snapshot in snapshot_backup.load_manifest():
+            print(f"{snapshot['time']}  {len(snapshot['changes'])} date blocks")
+        return 0
+    if args.restore:
+        until = None if args.restore == 'latest' else datetime.fromisoformat(args.restore)
+        return 0 if downloader.restore_backup(excel_path, until) else 1
+
+    if not os.path.exists(args.store or excel_path):
+        logger.error(f"No history to back up: {args.store or excel_path}")
+        return 1
+    stored = snapshot_backup.snapshot(downloader.load_history(excel_path))
+    if not stored:
+        logger.info("Backup already up to date")
+    return 0
+
+
+def cmd_export(args):
+    """Export the history again: Excel from the store, Parquet, layout and analytics tables"""
+    from easybourse_history import ParquetHistoryStore, export_history, open_history_store, replace_store
+
+    normalized = None if args.layout is None else args.layout == 'normalized'
+    downloader = make_downloader(args, normalized_layout=normalized)
+    excel_path = os.path.abspath(args.excel)
+    if not args.store and not (args.layout or args.parquet or args.analytics):
+        logger.warning("Nothing to export: give --layout, --parquet or --analytics (or use a history store)")
+        return 1
+
+    if args.store:
+        n_rows = export_history(open_history_store(args.store), excel_path, args.parquet,
+                                downloader.excel_engine, downloader.use_normalized_layout(excel_path))
+        logger.info(f"✅ History exported: {n_rows} rows")
+    else:
+        if args.layout:
+            from easybourse_excel import migrate_layout
+
+            downloader.backup_excel(excel_path)
+            migrate_layout(excel_path, normalized=normalized, engine=downloader.excel_engine)
+        if args.parquet:
+            df = downloader.load_history(excel_path)
+            replace_store(ParquetHistoryStore(args.parquet), df)
+            logger.info(f"✅ History exported to {args.parquet}: {len(df)} rows")
+
+    if args.analytics:
+        from easybourse_analytics import AnalyticsTables, analytics_dir
+
+        AnalyticsTables(analytics_dir(excel_path)).rebuild(downloader.load_history(excel_path))
+    return 0
+
+
+def cmd_run(args):
+    """Fetch and merge the current valuation: once, in daemon mode, for every account or from archives"""
+    excel_path = os.path.abspath(args.excel)
+    if args.metrics_summary:
+        from easybourse_metrics import load_run_log, run_log_path, summarize
+
+        print(summarize(load_run_log(run_log_path(excel_path))).to_string())
+        return 0
+    if args.backfill:
+        from easybourse_backfill import backfill
+
+        return 0 if backfill(make_downloader(args), args.backfill, excel_path) else 1
+
+    if args.accounts:
+        from easybourse_accounts import run_accounts
+
+        # Each account logs in with its own credentials, the downloader only merges
+        accounts = load_accounts()
+        return 0 if run_accounts(make_downloader(args, prometheus_path=args.prometheus), accounts, excel_path) else 1
+
+    downloader = make_downloader(args, *load_credentials(), prometheus_path=args.prometheus)
+    if args.daemon:
+        from easybourse_scheduler import EasyBourseScheduler
+
+        market_interval = args.market_interval or (300 if args.intraday else None)
+        EasyBourseScheduler(downloader, excel_path, interval=args.interval, market_interval=market_interval,
+                            intraday=args.intraday).run_forever()
+        return 0
+    return 0 if downloader.run(excel_path) else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Download EasyBourse valuations and maintain their history")
+    commands = parser.add_subparsers(dest='command', required=True, metavar='COMMAND')
+
+    history = argparse.ArgumentParser(add_help=False)
+    history.add_argument('--store', default=HISTORY_STORE, metavar='PATH',
+                         help="history store: a Parquet folder or a .db SQLite file (default: Excel only)")
+    workbook = argparse.ArgumentParser(add_help=False)
+    workbook.add_argument('--excel', default='EasyBourse.xlsx', metavar='XLSX', help="history workbook")
+    browser = argparse.ArgumentParser(add_help=False)
+    browser.add_argument('--profile-dir', metavar='DIR',
+                         help="persistent Chrome profile folder, reusing the cookie banner choice and the cache")
+    browser.add_argument('--lean-profile', action='store_true',
+                         help="skip images, media, fonts and trackers and return once the page structure is ready")
+
+    fetch = commands.add_parser('fetch', parents=[browser], help="log in and download the export (needs logins.py)")
+    fetch.add_argument('-o', '--output', metavar='CSV', help="export file (default: valorisation_<time>.csv)")
+    fetch.set_defaults(func=cmd_fetch)
+
+    parse = commands.add_parser('parse', help="parse an export and print its positions")
+    parse.add_argument('csv', help="export file")
+    parse.add_argument('-o', '--output', metavar='CSV', help="write the parsed table to CSV instead")
+    parse.set_defaults(func=cmd_parse)
+
+    merge = commands.add_parser('merge', parents=[history], help="merge an export into the history, offline")
+    merge.add_argument('csv', help="export file")
+    merge.add_argument('xlsx', nargs='?', default='EasyBourse.xlsx', help="history workbook")
+    merge.add_argument('--no-export', action='store_true', help=NO_EXPORT_HELP)
+    merge.set_defaults(func=cmd_merge)
+
+    backup = commands.add_parser('backup', parents=[history, workbook],
+                                 help="snapshot the history in <history>_Backup/, list or restore snapshots")
+    action = backup.add_mutually_exclusive_group()
+    action.add_argument('--list', action='store_true', help="list backup snapshots")
+    action.add_argument('--restore', nargs='?', const='latest', metavar='TIME',
+                        help="restore the workbook as of TIME (e.g. '2025-08-06 18:00') or the latest snapshot")
+    backup.set_defaults(func=cmd_backup)
+
+    export = commands.add_parser('export', parents=[history, workbook],
+                                 help="export the history again (Excel from the store, Parquet, analytics)")
+    export.add_argument('--layout', choices=['normalized', 'wide'],
+                        help="rewrite the workbook in the normalized (Data + Totals) or wide layout")
+    export.add_argument('--parquet', metavar='DIR', help="also export the history to a Parquet folder")
+    export.add_argument('--analytics', action='store_true', help="rebuild the Portfolio and Positions tables")
+    export.set_defaults(func=cmd_export)
+
+    run = commands.add_parser('run', parents=[history, workbook, browser],
+                              help="fetch and merge the current valuation (needs logins.py)")
+    run.add_argument('--daemon', action='store_true',
+                     help="keep running and update periodically with a persistent browser session")
+    run.add_argument('--interval', type=int, default=3600,
+                     help="seconds between updates outside market hours (daemon mode)")
+    run.add_argument('--market-interval', type=int, default=None,
+                     help="seconds between updates during market hours (daemon mode)")
+    run.add_argument('--intraday', action='store_true',
+                     help="daemon mode: store timestamped snapshots during market hours (every 300s unless "
+                          "--market-interval is given) and compact each day into the history after the close")
+    run.add_argument('--no-export', action='store_true', help=NO_EXPORT_HELP)
+    run.add_argument('--accounts', action='store_true',
+                     help="fetch every account listed in logins.accounts in parallel")
+    run.add_argument('--backfill', metavar='DIR',
+                     help="load every archived export (*.csv) of DIR into the history in one write (offline)")
+    run.add_argument('--metrics-summary', action='store_true',
+                     help="print p50/p95 wall time of each phase across past runs and exit")
+    run.add_argument('--prometheus', metavar='FILE',
+                     help="also write the metrics of each run to FILE for the node_exporter textfile collector")
+    run.set_defaults(func=cmd_run)
+    return parser
+
+
+def legacy_argv(argv):
+    """Map the former command line of easybourse_valorisation.py (flags only) to a command"""
+    if argv and argv[0] in COMMANDS + ['-h', '--help']:
+        return argv
+    for i, arg in enumerate(argv):
+        if arg in LEGACY_FLAGS:
+            command, option = LEGACY_FLAGS[arg]
+            return [command] + argv[:i] + [option] + argv[i + 1:]
+    return ['run'] + argv
+
+
+def main(argv=None, legacy=False):
+    argv = sys.argv[1:] if argv is None else argv
+    if legacy:
+        argv = legacy_argv(argv)
+    args = build_parser().parse_args(argv)
+    sys.exit(args.func(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import logging
+
+import pandas as pd
+
+from easybourse_history import TOTAL_COLUMNS, join_totals, split_totals
+
+logger = logging.getLogger(__name__)
+
+
+def _column_widths(df):
+    """Return the width of each column: longest value or header + 2, capped at 50"""
+    widths = []
+    for column in df.columns:
+        values = df[column]
+        length = values.astype(str).str.len().max() if len(values) > 0 else 0
+        widths.append(min(max(length, len(str(column))) + 2, 50))
+    return widths
+
+
+def has_totals_sheet(excel_path):
+    """Return True if the workbook uses the normalized layout (has a Totals sheet)"""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(excel_path, read_only=True)
+    try:
+        return 'Totals' in wb.sheetnames
+    finally:
+        wb.close()
+
+
+def read_history(excel_path):
+    """Read the history of the workbook, joining the Totals sheet back when the layout is normalized"""
+    with pd.ExcelFile(excel_path) as xls:
+        df = xls.parse('Data')
+        if 'Totals' in xls.sheet_names:
+            df = join_totals(df, xls.parse('Totals'))
+    return df
+
+
+def write_data_sheet(df, excel_path, engine='xlsxwriter', normalized=False):
+    """Write the full history with column widths and total column styling
+
+    The default layout repeats the totals on every row of the Data sheet; the
+    normalized layout writes positions to Data and one row per date to Totals.
+    """
+    if engine == 'xlsxwriter':
+        try:
+            import xlsxwriter  # noqa: F401
+        except ImportError:
+            logger.warning("xlsxwriter not installed, using openpyxl")
+            engine = 'openpyxl'
+
+    sheets = dict(zip(('Data', 'Totals'), split_totals(df))) if normalized else {'Data': df}
+
+    logger.info(f"💾 Saving to: {excel_path} ({engine}{', normalized' if normalized else ''})")
+    if engine == 'xlsxwriter':
+        _write_sheets_xlsxwriter(sheets, excel_path)
+    else:
+        _write_sheets_openpyxl(sheets, excel_path)
+
+
+def _write_sheets_xlsxwriter(sheets, excel_path):
+    """Stream each sheet row by row with xlsxwriter, styling whole columns at once"""
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(excel_path, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+    })
+    try:
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+        total_header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top',
+                                                   'bg_color': '#E6F3FF'})
+        total_format = workbook.add_format({'bg_color': '#E6F3FF'})
+        date_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+        total_date_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss', 'bg_color': '#E6F3FF'})
+
+        for sheet_name, df in sheets.items():
+            worksheet = workbook.add_worksheet(sheet_name)
+
+            # Widths and fills are set once per column
+            cell_formats = []
+            for idx, (column, width) in enumerate(zip(df.columns, _column_widths(df))):
+                is_total = column in TOTAL_COLUMNS
+                is_date = pd.api.types.is_datetime64_any_dtype(df[column])
+                if is_date:
+                    cell_format = total_date_format if is_total else date_format
+                else:
+                    cell_format = total_format if is_total else None
+                cell_formats.append(cell_format)
+                worksheet.set_column(idx, idx, width, cell_format)
+                worksheet.write(0, idx, column, total_header_format if is_total else header_format)
+
+            # Cells inherit the column format, rows are streamed in order
+            values = df.astype(object).where(df.notna(), None)
+            for row_idx, row in enumerate(values.itertuples(index=False, name=None), start=1):
+                for col_idx, value in enumerate(row):
+                    if value is not None:
+                        worksheet.write(row_idx, col_idx, value, cell_formats[col_idx])
+    finally:
+        workbook.close()
+
+
+def _write_sheets_openpyxl(sheets, excel_path):
+    """Write each sheet with pandas and openpyxl, styling cell by cell"""
+    from openpyxl.styles import PatternFill, Font
+    light_blue_fill = PatternFill(start_color="E6F3FF", end_color="E6F3FF", fill_type="solid")
+    bold_font = Font(bold=True)
+
+    with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
+        for sheet_name, df in sheets.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+            # Adjust column widths
+            worksheet = writer.sheets[sheet_name]
+            for idx, width in enumerate(_column_widths(df)):
+                # Handle columns beyond Z
+                if idx < 26:
+                    col_letter = chr(65 + idx)
+                else:
+                    col_letter = chr(65 + idx // 26 - 1) + chr(65 + idx % 26)
+                worksheet.column_dimensions[col_letter].width = width
+
+            # Format total columns with background color
+            for col_name in TOTAL_COLUMNS:
+                if col_name in df.columns:
+                    col_idx = df.columns.get_loc(col_name) + 1  # +1 because Excel starts at 1
+
+                    # Format header
+                    header_cell = worksheet.cell(row=1, column=col_idx)
+                    header_cell.fill = light_blue_fill
+                    header_cell.font = bold_font
+
+                    # Format data with light background
+                    for row in range(2, len(df) + 2):
+                        cell = worksheet.cell(row=row, column=col_idx)
+                        cell.fill = light_blue_fill
+
+
+def migrate_layout(excel_path, normalized=True, engine='xlsxwriter'):
+    """Rewrite an existing workbook in the normalized (Data + Totals) or wide (Data only) layout"""
+    df = read_history(excel_path)
+    df = df.loc[:, ~df.columns.astype(str).str.contains('Unnamed')]
+    write_data_sheet(df, excel_path, engine, normalized)
+    logger.info(f"✅ {excel_path} migrated to the {'normalized' if normalized else 'wide'} layout: {len(df)} rows")
+    return len(df)
@@ -0,0 +1,338 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Total columns repeated on every position row of a date
+TOTAL_COLUMNS = ['Valeur totale', 'Total positions sous dossier', 'Solde espèces']
+
+# Account name column, present when several accounts share one history
+ACCOUNT_COLUMN = 'Compte'
+
+
+def position_keys(df, with_account=False):
+    """Return the position key of every row: Code Isin, or Valeur when the ISIN is missing
+
+    With with_account, the key is prefixed with the account name (empty when unknown).
+    """
+    if 'Code Isin' in df.columns:
+        keys = df['Code Isin'].astype('object')
+        if 'Valeur' in df.columns:
+            keys = keys.where(keys.notna() & (keys.astype(str).str.strip() != ''), df['Valeur'])
+        keys = keys.astype(str)
+    else:
+        keys = df['Valeur'].astype(str)
+    if with_account:
+        if ACCOUNT_COLUMN in df.columns:
+            accounts = df[ACCOUNT_COLUMN].astype('object').fillna('').astype(str)
+        else:
+            accounts = pd.Series('', index=df.index)
+        keys = accounts + '|' + keys
+    return keys
+
+
+def upsert_positions(df_existing, df_new):
+    """Upsert whole date blocks of df_new into df_existing, keyed on (Date, Code Isin / Valeur)
+
+    Existing positions are updated, new positions are added, total columns are
+    rewritten for every row of the new dates and the result is sorted by date.
+    Returns (df_combined, stats) where stats maps each new date to its
+    number of updated and added rows.
+    """
+    df_new = df_new.copy()
+    df_new['Date'] = pd.to_datetime(df_new['Date'])
+
+    # Ensure total columns exist on both sides
+    for col in TOTAL_COLUMNS:
+        if col not in df_new.columns:
+            df_new[col] = None
+
+    if df_existing is None or len(df_existing) == 0:
+        df_combined = df_new
+        stats = {date: {'updated': 0, 'added': int(count)}
+                 for date, count in df_new.groupby('Date').size().items()}
+    else:
+        df_existing = df_existing.copy()
+        df_existing['Date'] = pd.to_datetime(df_existing['Date'])
+        for col in TOTAL_COLUMNS:
+            if col not in df_existing.columns:
+                df_existing[col] = None
+
+        # Build (Date, key) indexes for both frames
+        with_account = ACCOUNT_COLUMN in df_existing.columns or ACCOUNT_COLUMN in df_new.columns
+        existing_index = pd.MultiIndex.from_arrays([df_existing['Date'], position_keys(df_existing, with_account)])
+        new_index = pd.MultiIndex.from_arrays([df_new['Date'], position_keys(df_new, with_account)])
+        replaced = existing_index.isin(new_index)
+        matched = new_index.isin(existing_index)
+
+        # Keep values of columns unknown to the new export on updated rows
+        extra_columns = [c for c in df_existing.columns if c not in df_new.columns]
+        if extra_columns:
+            extra = df_existing[extra_columns].set_axis(existing_index)
+            extra = extra[~extra.index.duplicated(keep='first')]
+            df_new = pd.concat([df_new, extra.reindex(new_index).set_axis(df_new.index)], axis=1)
+
+        df_combined = pd.concat([df_existing[~replaced], df_new], ignore_index=True)
+
+        stats = {}
+        per_date = pd.DataFrame({'Date': df_new['Date'], 'matched': matched})
+        for date, group in per_date.groupby('Date')['matched']:
+            updated = int(group.sum())
+            stats[date] = {'updated': updated, 'added': len(group) - updated}
+
+        # Rewrite total columns for every row of the new dates (and accounts)
+        if with_account:
+            group_columns = ['Date', ACCOUNT_COLUMN]
+            if ACCOUNT_COLUMN not in df_combined.columns:
+                df_combined[ACCOUNT_COLUMN] = None
+            if ACCOUNT_COLUMN not in df_new.columns:
+                df_new[ACCOUNT_COLUMN] = None
+        else:
+            group_columns = ['Date']
+        totals = df_new.groupby(group_columns, dropna=False)[TOTAL_COLUMNS].first().reset_index()
+        aligned = df_combined[group_columns].merge(totals, on=group_columns, how='left')
+        for col in TOTAL_COLUMNS:
+            values = aligned[col].to_numpy()
+            df_combined[col] = df_combined[col].where(pd.isna(values), values)
+
+    # Sort by date (and account) then by value, keeping arrival order for ties
+    sort_columns = [c for c in ('Date', ACCOUNT_COLUMN, 'Valeur') if c in df_combined.columns]
+    df_combined = df_combined.sort_values(sort_columns, kind='mergesort').reset_index(drop=True)
+
+    # Remove Unnamed columns
+    df_combined = df_combined.loc[:, ~df_combined.columns.astype(str).str.contains('Unnamed')]
+
+    return df_combined, stats
+
+
+def _totals_keys(*frames):
+    """Return the columns identifying a totals row: Date, plus the account when present"""
+    if any(ACCOUNT_COLUMN in df.columns for df in frames):
+        return ['Date', ACCOUNT_COLUMN]
+    return ['Date']
+
+
+def split_totals(df):
+    """Split a history into (positions, totals): totals hold one row per date (and account)"""
+    keys = _totals_keys(df)
+    total_columns = [c for c in TOTAL_COLUMNS if c in df.columns]
+    totals = df.groupby(keys, dropna=False, sort=True)[total_columns].first().reset_index()
+    return df.drop(columns=total_columns), totals
+
+
+def join_totals(positions, totals):
+    """Repeat the daily totals on every position row, the inverse of split_totals"""
+    positions = positions.drop(columns=[c for c in TOTAL_COLUMNS if c in positions.columns])
+    keys = [c for c in _totals_keys(totals) if c in positions.columns]
+    positions['Date'] = pd.to_datetime(positions['Date'])
+    totals = totals.assign(Date=pd.to_datetime(totals['Date']))
+    return positions.merge(totals, on=keys, how='left')
+
+
+def upsert_totals(df_existing, df_new):
+    """Upsert daily totals rows, keyed on Date (and account); missing new values keep the stored ones"""
+    df_new = df_new.assign(Date=pd.to_datetime(df_new['Date']))
+    if df_existing is None or len(df_existing) == 0:
+        return df_new.sort_values(_totals_keys(df_new), kind='mergesort').reset_index(drop=True)
+    df_existing = df_existing.assign(Date=pd.to_datetime(df_existing['Date']))
+    keys = _totals_keys(df_existing, df_new)
+    for df in (df_existing, df_new):
+        for col in keys:
+            if col not in df.columns:
+                df[col] = None
+    combined = df_new.set_index(keys).combine_first(df_existing.set_index(keys)).reset_index()
+    columns = list(df_existing.columns) + [c for c in df_new.columns if c not in df_existing.columns]
+    return combined[columns].sort_values(keys, kind='mergesort').reset_index(drop=True)
+
+
+def fingerprint_dates(df):
+    """Return {valuation date (YYYY-MM-DD HH:MM:SS): sha256} of the positions and totals of each date
+
+    Values are hashed in canonical types (numbers as float64, text as str, missing text as ''),
+    so a block parsed from an export and the same block read back from Excel hash the same.
+    """
+    key_columns = [c for c in (ACCOUNT_COLUMN, 'Code Isin', 'Valeur') if c in df.columns]
+    columns = sorted(c for c in df.columns if c != 'Date')
+    canonical = pd.DataFrame({
+        c: df[c].astype('float64') if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])
+        else df[c].astype('object').where(df[c].notna(), '')
+        for c in columns
+    }, index=df.index)
+    fingerprints = {}
+    for date, block in canonical.groupby(pd.to_datetime(df['Date']), sort=True):
+        block = block.astype(str).sort_values(key_columns or columns, kind='mergesort')
+        content = block.to_csv(index=False).encode('utf-8')
+        fingerprints[pd.Timestamp(date).strftime('%Y-%m-%d %H:%M:%S')] = hashlib.sha256(content).hexdigest()
+    return fingerprints
+
+
+def fingerprints_path(excel_path):
+    """Return the fingerprint file stored next to the history"""
+    return os.path.splitext(excel_path)[0] + '_fingerprints.json'
+
+
+def load_fingerprints(path):
+    """Load stored fingerprints, empty if the file is missing or unreadable"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_fingerprints(path, fingerprints):
+    """Merge fingerprints into the stored ones"""
+    stored = load_fingerprints(path)
+    stored.update(fingerprints)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(stored, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _partition_key(date):
+    """Return the partition key (YYYY-MM-DD) of a valuation date"""
+    return pd.Timestamp(date).strftime('%Y-%m-%d')
+
+
+class ParquetHistoryStore:
+    """History stored as one Parquet file per valuation date (requires pyarrow)"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _partition_path(self, key):
+        return os.path.join(self.directory, f'date={key}.parquet')
+
+    def dates(self):
+        """Return the sorted partition keys present in the store"""
+        return sorted(f[len('date='):-len('.parquet')] for f in os.listdir(self.directory)
+                      if f.startswith('date=') and f.endswith('.parquet'))
+
+    def load(self, dates=None):
+        """Load the given valuation dates (all dates if None) into one DataFrame"""
+        keys = self.dates() if dates is None else sorted({_partition_key(d) for d in dates})
+        frames = [pd.read_parquet(self._partition_path(k)) for k in keys
+                  if os.path.exists(self._partition_path(k))]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def write(self, df):
+        """Replace the partitions of every valuation date present in df"""
+        for key, block in df.groupby(df['Date'].dt.strftime('%Y-%m-%d'), sort=True):
+            path = self._partition_path(key)
+            tmp_path = path + '.tmp'
+            block.reset_index(drop=True).to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+
+    def remove(self, keys):
+        """Delete the partitions of the given keys (YYYY-MM-DD)"""
+        for key in keys:
+            if os.path.exists(self._partition_path(key)):
+                os.remove(self._partition_path(key))
+
+
+class SQLiteHistoryStore:
+    """History stored in a local SQLite database, indexed by valuation date"""
+
+    TABLE = 'positions'
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def _columns(self, conn):
+        return [row[1] for row in conn.execute(f'PRAGMA table_info("{self.TABLE}")')]
+
+    def dates(self):
+        """Return the sorted partition keys present in the store"""
+        with closing(self._connect()) as conn:
+            if not self._columns(conn):
+                return []
+            rows = conn.execute(f'SELECT DISTINCT substr("Date", 1, 10) FROM "{self.TABLE}" ORDER BY 1')
+            return [row[0] for row in rows]
+
+    def load(self, dates=None):
+        """Load the given valuation dates (all dates if None) into one DataFrame"""
+        with closing(self._connect()) as conn:
+            if not self._columns(conn):
+                return pd.DataFrame()
+            query = f'SELECT * FROM "{self.TABLE}"'
+            params = []
+            if dates is not None:
+                params = sorted({_partition_key(d) for d in dates})
+                query += f' WHERE substr("Date", 1, 10) IN ({", ".join("?" * len(params))})'
+            df = pd.read_sql_query(query, conn, params=params, parse_dates=['Date'])
+        return df.drop(columns='rowid', errors='ignore')
+
+    def write(self, df):
+        """Replace the rows of every valuation date present in df"""
+        df = df.copy()
+        df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d %H:%M:%S')
+        keys = sorted(df['Date'].str[:10].unique())
+        with closing(self._connect()) as conn, conn:
+            columns = self._columns(conn)
+            if columns:
+                # Add columns that appeared in the export since the table was created
+                for col in df.columns:
+                    if col not in columns:
+                        conn.execute(f'ALTER TABLE "{self.TABLE}" ADD COLUMN "{col}"')
+                conn.execute(f'DELETE FROM "{self.TABLE}" WHERE substr("Date", 1, 10) IN '
+                             f'({", ".join("?" * len(keys))})', keys)
+            df.to_sql(self.TABLE, conn, if_exists='append', index=False)
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{self.TABLE}_date" ON "{self.TABLE}" ("Date")')
+
+    def remove(self, keys):
+        """Delete the rows of the given partition keys (YYYY-MM-DD)"""
+        keys = sorted(keys)
+        with closing(self._connect()) as conn, conn:
+            if keys and self._columns(conn):
+                conn.execute(f'DELETE FROM "{self.TABLE}" WHERE substr("Date", 1, 10) IN '
+                             f'({", ".join("?" * len(keys))})', keys)
+
+
+def open_history_store(path):
+    """Open a history store: SQLite for .db/.sqlite files, Parquet folder otherwise"""
+    if os.path.splitext(path)[1].lower() in ('.db', '.sqlite', '.sqlite3'):
+        return SQLiteHistoryStore(path)
+    return ParquetHistoryStore(path)
+
+
+def update_store(store, df_new):
+    """Upsert df_new into the store, touching only the partitions of its valuation dates"""
+    df_existing = store.load(pd.to_datetime(df_new['Date']).unique())
+    df_block, stats = upsert_positions(df_existing, df_new)
+    store.write(df_block)
+    return stats
+
+
+def replace_store(store, df):
+    """Make df the whole content of the store: its dates are rewritten, the other dates removed"""
+    kept = {_partition_key(date) for date in pd.to_datetime(df['Date']).unique()}
+    if kept:
+        store.write(df)
+    store.remove([key for key in store.dates() if key not in kept])
+
+
+def export_history(store, excel_path=None, parquet_dir=None, engine='xlsxwriter', normalized=False):
+    """Export the whole store to the Excel Data sheet and/or a Parquet folder for Power BI"""
+    from easybourse_excel import write_data_sheet
+
+    df = store.load()
+    if len(df) > 0:
+        df = df.sort_values(['Date', 'Valeur'], kind='mergesort').reset_index(drop=True)
+    if excel_path:
+        write_data_sheet(df, excel_path, engine, normalized)
+    if parquet_dir:
+        replace_store(ParquetHistoryStore(parquet_dir), df)
+    return len(df)
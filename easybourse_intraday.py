@@ -0,0 +1,84 @@
+import json
+import logging
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from easybourse_history import fingerprint_dates
+
+logger = logging.getLogger(__name__)
+
+# Fetch time of each intraday snapshot, next to the valuation Date
+SNAPSHOT_COLUMN = 'Snapshot'
+
+
+def intraday_dir(excel_path):
+    """Return the intraday store folder stored next to the history"""
+    return os.path.splitext(excel_path)[0] + '_Intraday'
+
+
+class IntradayStore:
+    """Intraday snapshots appended to one CSV file per day, until compacted into the history
+
+    A snapshot identical to the previous one of the day is not stored, so the
+    size of a day file depends on how often the valuation changes, not on how
+    often it is polled. Compacting a closed day keeps its last snapshot only and
+    deletes the file.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.state_path = os.path.join(directory, 'last_snapshot.json')
+
+    def _day_path(self, day):
+        return os.path.join(self.directory, f'{day}.csv')
+
+    def days(self):
+        """Return the sorted days (YYYY-MM-DD) with snapshots not compacted yet"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(f[:-len('.csv')] for f in os.listdir(self.directory) if f.endswith('.csv'))
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def append(self, df, now=None):
+        """Append a parsed export as a snapshot taken at now, returns the rows stored (0 if unchanged)"""
+        now = now or datetime.now()
+        day = now.strftime('%Y-%m-%d')
+        fingerprint = ''.join(fingerprint_dates(df).values())
+        state = self._load_state()
+        if state.get(day) == fingerprint:
+            return 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._day_path(day)
+        snapshot = df.assign(**{SNAPSHOT_COLUMN: pd.Timestamp(now).floor('s')})
+        snapshot.to_csv(path, mode='a', header=not os.path.exists(path), index=False,
+                        date_format='%Y-%m-%d %H:%M:%S')
+
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({day: fingerprint}, f)
+        os.replace(tmp_path, self.state_path)
+        return len(snapshot)
+
+    def load(self, day):
+        """Return every snapshot of a day"""
+        return pd.read_csv(self._day_path(day), parse_dates=['Date', SNAPSHOT_COLUMN])
+
+    def end_of_day(self, day):
+        """Return the last snapshot of a day, without the snapshot column, as a normal export"""
+        df = self.load(day)
+        last = df[df[SNAPSHOT_COLUMN] == df[SNAPSHOT_COLUMN].max()]
+        return last.drop(columns=SNAPSHOT_COLUMN).reset_index(drop=True)
+
+    def remove(self, day):
+        """Delete the snapshots of a compacted day"""
+        os.remove(self._day_path(day))
+        logger.info(f"Intraday snapshots of {day} compacted")
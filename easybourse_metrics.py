@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+def peak_rss():
+    """Return the peak resident memory of the process so far in bytes, None when it cannot be read"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, 'peak_wset', info.rss)
+
+
+def run_log_path(excel_path):
+    """Return the run log stored next to the history"""
+    return os.path.splitext(excel_path)[0] + '_runs.jsonl'
+
+
+class RunMetrics:
+    """Wall time, row counts, bytes read and written of each phase of one run, and the process peak RSS"""
+
+    def __init__(self):
+        self.started = datetime.now()
+        self._start = time.perf_counter()
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Time a phase; the yielded dict takes its 'rows', 'bytes_read' and 'bytes_written'"""
+        record = self.phases.setdefault(name, {'seconds': 0.0})
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(record['seconds'] + time.perf_counter() - start, 4)
+
+    def record(self, status, **extra):
+        """Return the run record: start time, status, total time, process peak RSS, extra fields and phases
+
+        The peak RSS is the high-water mark of the process since it started (previous daemon runs included),
+        not of this run or of one phase, hence read once here.
+        """
+        return {
+            'time': self.started.isoformat(timespec='seconds'),
+            'status': status,
+            'seconds': round(time.perf_counter() - self._start, 4),
+            'process_peak_rss_bytes': peak_rss(),
+            **extra,
+            'phases': self.phases,
+        }
+
+
+def append_run_log(path, record):
+    """Append one run record as a JSON line"""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def load_run_log(path):
+    """Return the run records of the log, skipping unreadable lines"""
+    records = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return records
+
+
+def write_prometheus(path, record):
+    """Write the run record for the node_exporter textfile collector (atomically, as it requires)"""
+    lines = [
+        '# HELP easybourse_run_timestamp_seconds Start time of the last run.',
+        '# TYPE easybourse_run_timestamp_seconds gauge',
+        f"easybourse_run_timestamp_seconds {datetime.fromisoformat(record['time']).timestamp():.0f}",
+        '# HELP easybourse_run_success 1 if the last run succeeded (or had nothing to update).',
+        '# TYPE easybourse_run_success gauge',
+        f"easybourse_run_success {0 if record['status'] == 'failed' else 1}",
+        '# HELP easybourse_run_duration_seconds Wall time of the last run.',
+        '# TYPE easybourse_run_duration_seconds gauge',
+        f"easybourse_run_duration_seconds {record['seconds']}",
+    ]
+    if record.get('process_peak_rss_bytes') is not None:
+        lines += [
+            '# HELP easybourse_process_peak_rss_bytes Peak resident memory of the process since it started.',
+            '# TYPE easybourse_process_peak_rss_bytes gauge',
+            f"easybourse_process_peak_rss_bytes {record['process_peak_rss_bytes']}",
+        ]
+    for field, metric, help_text in (
+            ('seconds', 'easybourse_phase_duration_seconds', 'Wall time of each phase of the last run.'),
+            ('rows', 'easybourse_phase_rows', 'Rows handled by each phase of the last run.'),
+            ('bytes_read', 'easybourse_phase_read_bytes', 'Bytes read by each phase of the last run.'),
+            ('bytes_written', 'easybourse_phase_written_bytes', 'Bytes written by each phase of the last run.')):
+        values = [(phase, values[field]) for phase, values in record['phases'].items() if field in values]
+        if values:
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} gauge']
+            lines += [f'{metric}{{phase="{phase}"}} {value}' for phase, value in values]
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+
+def summarize(records):
+    """Return p50 and p95 of the wall time of each phase (and of whole runs) across run records"""
+    rows = []
+    for record in records:
+        rows.append({'phase': 'run', 'seconds': record['seconds']})
+        rows.extend({'phase': phase, 'seconds': values['seconds']}
+                    for phase, values in record.get('phases', {}).items())
+    if not rows:
+        return pd.DataFrame(columns=['runs', 'p50 (s)', 'p95 (s)', 'max (s)'])
+
+    seconds = pd.DataFrame(rows).groupby('phase', sort=False)['seconds']
+    return pd.DataFrame({
+        'runs': seconds.size(),
+        'p50 (s)': seconds.quantile(0.5),
+        'p95 (s)': seconds.quantile(0.95),
+        'max (s)': seconds.max(),
+    }).round(3)
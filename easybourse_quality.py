@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from easybourse_history import ACCOUNT_COLUMN, TOTAL_COLUMNS, fingerprint_dates, position_keys
+
+logger = logging.getLogger(__name__)
+
+# Columns that must hold a number on every row of an export
+REQUIRED_NUMERIC_COLUMNS = ['Quantité', 'Cours', 'Prix moyen', 'Valorisation', '+/- value', 'Performance (%)',
+                            'Poids'] + TOTAL_COLUMNS
+
+# Default tolerances, overridable with the tolerances argument of check_blocks:
+# 'valuation' relative difference between the sum of Valorisation and Total positions sous dossier,
+# 'weights' percentage points between the sum of Poids and 100%.
+# Both are widened by the rounding of each line (0.01€ and 0.005 points per position).
+DEFAULT_TOLERANCES = {
+    'valuation': 0.001,
+    'weights': 0.5,
+}
+
+ISIN_PATTERN = r'[A-Z]{2}[A-Z0-9]{9}[0-9]'
+
+# Letters of an ISIN count as two digits (A=10 ... Z=35) in its check digit
+ISIN_LETTER_DIGITS = {ord(letter): str(value) for value, letter in enumerate('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 10)}
+ISIN_MAX_DIGITS = 24
+
+
+def quarantine_dir(excel_path):
+    """Return the quarantine folder stored next to the history"""
+    return os.path.splitext(excel_path)[0] + '_Quarantine'
+
+
+def valid_isins(codes):
+    """Return a boolean array: True for each well-formed ISIN (pattern and Luhn check digit)"""
+    # Each distinct code is checked once, a history repeats the same ISINs on every date
+    codes, uniques = pd.factorize(pd.Series(codes, dtype='object'))
+    uniques = pd.Series(uniques, dtype='object').astype(str).str.strip()
+    valid = uniques.str.fullmatch(ISIN_PATTERN).to_numpy(dtype=bool, copy=True)
+    if valid.any():
+        # Left-padded digit strings, checked all at once: every second digit from the right is doubled
+        digits = uniques[valid].str.translate(ISIN_LETTER_DIGITS).str.zfill(ISIN_MAX_DIGITS)
+        matrix = np.frombuffer(''.join(digits).encode('ascii'), dtype=np.uint8).reshape(-1, ISIN_MAX_DIGITS) - 48
+        doubled = matrix[:, -2::-2] * 2
+        matrix[:, -2::-2] = doubled - 9 * (doubled > 9)
+        valid[valid] = matrix.sum(axis=1) % 10 == 0
+    # Missing codes (-1) are not valid
+    return np.append(valid, False)[codes]
+
+
+def check_blocks(df, tolerances=None):
+    """Check every date block (per account, if any) of parsed exports before they are merged
+
+    Returns (issues, rejected): one issue row per failed check of a block, with
+    the block key, 'check' and 'detail', and a boolean array of the rows of rejected blocks.
+    """
+    tolerances = {**DEFAULT_TOLERANCES, **(tolerances or {})}
+    keys = ['Date'] + ([ACCOUNT_COLUMN] if ACCOUNT_COLUMN in df.columns else [])
+    block = df.groupby(keys, sort=False, observed=True, dropna=False).ngroup().to_numpy()
+    block_keys = df[keys].groupby(block).first()
+    n_positions = pd.Series(block).value_counts().sort_index()
+    failures = []
+
+    # Missing columns or values (unparsable numbers are read as NaN)
+    missing_columns = [c for c in REQUIRED_NUMERIC_COLUMNS if c not in df.columns]
+    present = [c for c in REQUIRED_NUMERIC_COLUMNS if c in df.columns]
+    missing = df[present].apply(pd.to_numeric, errors='coerce').isna().groupby(block).sum()
+    for block_id, counts in missing[missing.any(axis=1) | bool(missing_columns)].iterrows():
+        details = [f"{column} ({count} rows)" for column, count in counts.items() if count]
+        details += [f"{column} (column)" for column in missing_columns]
+        failures.append((block_id, 'missing_values', ', '.join(details)))
+
+    # Sum of the position valuations against the reported total
+    if {'Valorisation', 'Total positions sous dossier'} <= set(df.columns):
+        valuation = df['Valorisation'].groupby(block).sum()
+        total = df['Total positions sous dossier'].groupby(block).first()
+        allowed = np.maximum(0.01 * n_positions, tolerances['valuation'] * total.abs())
+        for block_id in total.index[(valuation - total).abs() > allowed]:
+            failures.append((block_id, 'valuation_total',
+                             f"positions sum to {valuation[block_id]:,.2f}, total is {total[block_id]:,.2f}"))
+
+    # Weights add up to 100% of the account, or of the positions when cash is left out
+    if 'Poids' in df.columns:
+        weights = df['Poids'].groupby(block).sum()
+        allowed = tolerances['weights'] + 0.005 * n_positions
+        within = (weights - 100).abs() <= allowed
+        if {'Valeur totale', 'Total positions sous dossier'} <= set(df.columns):
+            share = (100 * df['Total positions sous dossier'] / df['Valeur totale']).groupby(block).first()
+            within |= (weights - share).abs() <= allowed
+        for block_id in weights.index[~within & weights.notna()]:
+            failures.append((block_id, 'weights', f"weights sum to {weights[block_id]:.2f}%"))
+
+    # ISINs well formed (a missing ISIN is allowed, the position is then keyed on Valeur) and unique
+    if 'Code Isin' in df.columns:
+        codes = df['Code Isin'].astype('object')
+        given = codes.notna() & (codes.astype(str).str.strip() != '')
+        malformed = given.to_numpy() & ~valid_isins(codes)
+        for block_id in np.unique(block[malformed]):
+            bad = codes[malformed & (block == block_id)].astype(str).unique()
+            failures.append((block_id, 'isin_format', ', '.join(bad[:5]) + ('...' if len(bad) > 5 else '')))
+    positions = position_keys(df).to_numpy()
+    duplicated = pd.DataFrame({'block': block, 'key': positions}).duplicated().to_numpy()
+    for block_id in np.unique(block[duplicated]):
+        keys_found = pd.unique(positions[duplicated & (block == block_id)])
+        failures.append((block_id, 'isin_duplicate', ', '.join(keys_found[:5])))
+
+    issues = pd.DataFrame(failures, columns=['block', 'check', 'detail'])
+    issues = block_keys.join(issues.set_index('block'), how='inner').reset_index(drop=True)
+    rejected = np.isin(block, [block_id for block_id, _, _ in failures])
+    return issues, rejected
+
+
+def quarantine(df, issues, directory):
+    """Store each rejected block and its issues in the quarantine folder, returns the new CSV paths
+
+    Files are named after the date, account and content hash of the block, so an export
+    rejected again on the next runs is not stored again.
+    """
+    os.makedirs(directory, exist_ok=True)
+    keys = ['Date'] + ([ACCOUNT_COLUMN] if ACCOUNT_COLUMN in df.columns else [])
+    csv_paths = []
+    for key, block in df.groupby(keys, sort=True, observed=True, dropna=False):
+        date, account = key[0], (key[1] if len(key) > 1 else None)
+        content_hash = next(iter(fingerprint_dates(block).values()))
+        name = '_'.join([pd.Timestamp(date).strftime('%Y%m%d_%H%M%S')] + ([str(account)] if account else [])
+                        + [content_hash[:12]])
+        csv_path = os.path.join(directory, f'{name}.csv')
+        if os.path.exists(csv_path):
+            logger.info(f"🚫 {pd.Timestamp(date):%Y-%m-%d} already quarantined in {csv_path}")
+            continue
+        block.to_csv(csv_path, index=False)
+
+        matching = issues['Date'] == date
+        if account:
+            matching &= issues[ACCOUNT_COLUMN] == account
+        records = issues[matching].astype({'Date': 'str'}).to_dict(orient='records')
+        with open(os.path.join(directory, f'{name}.json'), 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=1)
+        for issue in records:
+            logger.warning(f"🚫 {issue['Date'][:10]} {issue['check']}: {issue['detail']}")
+        logger.warning(f"{len(block)} rows quarantined in {csv_path}")
+        csv_paths.append(csv_path)
+    return csv_paths
@@ -0,0 +1,127 @@
+import logging
+import os
+import random
+import signal
+import threading
+from datetime import datetime, time as dt_time, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+class EasyBourseScheduler:
+    """Run EasyBourseValorisationDownloader periodically, keeping one logged-in browser between cycles"""
+
+    def __init__(self, downloader, excel_path=None, interval=3600, market_interval=None,
+                 market_open=dt_time(9, 0), market_close=dt_time(17, 35), intraday=False, retry_delay=30,
+                 max_retries=5):
+        self.downloader = downloader
+        self.excel_path = excel_path or 'EasyBourse.xlsx'
+        # During market hours, store timestamped snapshots and compact them into the history after the close
+        self.intraday = intraday
+        self.interval = interval
+        self.market_interval = market_interval if market_interval is not None else interval
+        self.market_open = market_open
+        self.market_close = market_close
+        # Transient failures (network, empty export) are retried after retry_delay, doubling each time
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        self.stop_event = threading.Event()
+
+    def market_hours(self, now=None):
+        """Return True on weekdays between market_open and market_close"""
+        now = now or datetime.now()
+        return now.weekday() < 5 and self.market_open <= now.time() < self.market_close
+
+    def next_interval(self, now=None):
+        """Return the seconds to wait before the next cycle: market_interval on weekdays during market hours"""
+        return self.market_interval if self.market_hours(now) else self.interval
+
+    def backoff(self, attempt):
+        """Return the seconds to wait before retry attempt (0 for the first): exponential, jittered, capped"""
+        delay = min(self.retry_delay * 2 ** attempt, self.next_interval())
+        # Jitter in [delay/2, delay] so that several instances do not retry in step
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def last_closed_day(self, now=None):
+        """Return the last day (YYYY-MM-DD) whose session is over: today after the close, yesterday before"""
+        now = now or datetime.now()
+        day = now.date() if now.time() >= self.market_close else now.date() - timedelta(days=1)
+        return day.strftime('%Y-%m-%d')
+
+    def start_driver(self):
+        """Start the browser, None if it failed (classified as a network failure, so it is retried)"""
+        from easybourse_valorisation import NETWORK_FAILURE
+
+        try:
+            return self.downloader.setup_driver()
+        except Exception as e:
+            self.downloader.failure = NETWORK_FAILURE
+            logger.error(f"Unable to start the browser: {e}")
+            return None
+
+    def run_cycle(self, driver):
+        """Run one update: an intraday snapshot during market hours, compaction and a full update otherwise"""
+        if self.intraday and self.market_hours():
+            return self.downloader.run(self.excel_path, driver=driver, intraday=True)
+        if self.intraday:
+            self.downloader.compact_intraday(os.path.abspath(self.excel_path), self.last_closed_day())
+        return self.downloader.run(self.excel_path, driver=driver)
+
+    def stop(self, *_):
+        """Ask the scheduler to stop after the current cycle"""
+        logger.info("Stop requested, finishing current cycle...")
+        self.stop_event.set()
+
+    def run_forever(self, max_cycles=None):
+        """Run cycles until stopped (Ctrl+C, SIGTERM or stop()) or max_cycles is reached"""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self.stop)
+            signal.signal(signal.SIGTERM, self.stop)
+
+        from easybourse_valorisation import TRANSIENT_FAILURES
+
+        driver = None
+        cycles = 0
+        retries = 0
+        try:
+            while not self.stop_event.is_set():
+                cycles += 1
+                logger.info(f"🔁 Cycle {cycles} started")
+
+                # Start a browser on first cycle, or after a failed one
+                if driver is None:
+                    driver = self.start_driver()
+                succeeded = driver is not None and self.run_cycle(driver)
+                if not succeeded and driver is not None:
+                    logger.warning("Cycle failed, the browser will be restarted")
+                    self._quit(driver)
+                    driver = None
+
+                if max_cycles is not None and cycles >= max_cycles:
+                    break
+
+                interval = self.next_interval()
+                failure = self.downloader.failure
+                if succeeded:
+                    retries = 0
+                elif failure in TRANSIENT_FAILURES and retries < self.max_retries:
+                    interval = round(self.backoff(retries))
+                    retries += 1
+                    logger.warning(f"Transient failure ({failure}), retry {retries}/{self.max_retries}")
+                else:
+                    retries = 0
+                    if failure:
+                        logger.error(f"Failure ({failure}) not retried before the next update")
+                logger.info(f"Next update in {interval}s (Ctrl+C to stop)")
+                self.stop_event.wait(interval)
+        finally:
+            self._quit(driver)
+            logger.info("Scheduler stopped")
+
+    @staticmethod
+    def _quit(driver):
+        if driver is not None:
+            try:
+                driver.quit()
+            except Exception as e:
+                logger.warning(f"Unable to close browser: {e}")
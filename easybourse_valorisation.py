@@ -1,26 +1,149 @@
+import io
 import os
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
 import pandas as pd
 from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
 import logging
 import re
 
+from easybourse_analytics import AnalyticsTables, analytics_dir
+from easybourse_backup import SnapshotBackup, backup_dir
+from easybourse_excel import has_totals_sheet, read_history, write_data_sheet
+from easybourse_intraday import IntradayStore, intraday_dir
+from easybourse_metrics import RunMetrics, append_run_log, run_log_path, write_prometheus
+from easybourse_quality import check_blocks, quarantine, quarantine_dir
+from easybourse_history import (TOTAL_COLUMNS, export_history, fingerprint_dates, fingerprints_path,
+                                load_fingerprints, open_history_store, replace_store, save_fingerprints,
+                                update_store, upsert_positions)
+
 # Logging configuration
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+# CSV export layout and schema
+CSV_TABLE_HEADER = 'Valeur;Code Isin;Place de cotation'
+NUMERIC_COLUMNS = ['Quantité', 'Cours', 'Prix moyen', 'Valorisation', '+/- value', 'Performance (%)', 'Poids']
+CATEGORICAL_COLUMNS = ['Valeur', 'Code Isin', 'Place de cotation']
+
+# Default timeout (seconds) of each wait, overridable with the timeouts argument
+DEFAULT_TIMEOUTS = {
+    'login_page': 10,
+    'cookie_banner': 3,
+    'cookie_banner_closed': 3,
+    'password_page': 10,
+    'keypad': 5,
+    'post_login': 15,
+    'download': 30,
+    'page_load': 15,
+    # A page loaded for this long without the awaited element is a layout change, not a slow page
+    'settle': 2,
+}
+
+# Failure classes of a run; network timeouts and empty exports are transient and retried
+CREDENTIALS_FAILURE = 'credentials'
+LAYOUT_FAILURE = 'layout'
+NETWORK_FAILURE = 'network'
+EMPTY_EXPORT_FAILURE = 'empty_export'
+INVALID_EXPORT_FAILURE = 'invalid_export'
+TRANSIENT_FAILURES = (NETWORK_FAILURE, EMPTY_EXPORT_FAILURE)
+
+# Requests blocked by the lean profile: images, media, fonts and tracking hosts
+LEAN_BLOCKED_EXTENSIONS = ['png', 'jpg', 'jpeg', 'gif', 'webp', 'svg', 'ico', 'mp4', 'webm', 'mp3',
+                           'woff', 'woff2', 'ttf', 'otf', 'eot']
+LEAN_BLOCKED_URLS = [pattern for ext in LEAN_BLOCKED_EXTENSIONS for pattern in (f'*.{ext}', f'*.{ext}?*')] + [
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*facebook.net*',
+    '*hotjar.com*', '*criteo.com*', '*criteo.net*', '*xiti.com*', '*abtasty.com*', '*contentsquare.net*',
+    '*bat.bing.com*', '*analytics.tiktok.com*', '*snap.licdn.com*',
+]
+
+# Returns the text of the first visible error message of the login pages, null if none.
+# Only alerts and form error texts count: a wrapper whose class merely contains "error"
+# (e.g. an error boundary around the form) holds the whole form, hence the length limit.
+FIND_LOGIN_ERROR_JS = """
+const selector = '[role="alert"], .MuiAlert-message, .MuiFormHelperText-root.Mui-error, '
+    + '[class*="error-message" i], [class*="errorMessage" i]';
+for (const el of document.querySelectorAll(selector)) {
+    const text = (el.innerText || '').trim();
+    if (text && text.length <= 200 && el.getClientRects().length > 0) {
+        return text;
+    }
+}
+return null;
+"""
+
+# Identifies the current document (a new one per navigation, not per in-page re-render) and its load state
+PAGE_STATE_JS = "return [performance.timeOrigin, document.readyState];"
+
+# Returns the ten visible digit buttons of the virtual keyboard as {digit: element}.
+# Buttons are grouped by CSS class (generated jss* names change between releases),
+# the first class holding all ten digits wins, falling back to <button> elements.
+FIND_VIRTUAL_KEYBOARD_JS = """
+const groups = {};
+const buttons = {};
+for (const el of document.querySelectorAll('body *')) {
+    const text = (el.textContent || '').trim();
+    if (text.length !== 1 || text < '0' || text > '9' || el.getClientRects().length === 0) {
+        continue;
+    }
+    for (const cls of el.classList) {
+        groups[cls] = groups[cls] || {};
+        if (!(text in groups[cls])) {
+            groups[cls][text] = el;
+        }
+    }
+    if (el.tagName === 'BUTTON' && !(text in buttons)) {
+        buttons[text] = el;
+    }
+}
+for (const cls in groups) {
+    if (Object.keys(groups[cls]).length === 10) {
+        return groups[cls];
+    }
+}
+return Object.keys(buttons).length === 10 ? buttons : null;
+"""
+
+
+class FetchError(Exception):
+    """A failed login or download, with its failure class"""
+
+    def __init__(self, failure, message):
+        super().__init__(message)
+        self.failure = failure
+
+
+def classify_failure(error):
+    """Return the failure class of an error raised while logging in or downloading, None if unknown"""
+    from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+
+    if isinstance(error, FetchError):
+        return error.failure
+    if isinstance(error, NoSuchElementException):
+        return LAYOUT_FAILURE
+    if isinstance(error, TimeoutException) or (isinstance(error, WebDriverException) and 'net::ERR_' in str(error)):
+        return NETWORK_FAILURE
+    return None
+
+
 class EasyBourseValorisationDownloader:
-    def __init__(self, username, password, download_dir=None):
+    def __init__(self, username, password, download_dir=None, history_store=None, export_excel=True,
+                 parquet_export_dir=None, excel_engine='xlsxwriter', timeouts=None,
+                 download_mode='http', base_url="https://www.easybourse.com", profile_dir=None,
+                 normalized_layout=None, skip_unchanged=True, backup_mode='incremental', analytics=True,
+                 run_log=True, prometheus_path=None, lean_profile=False, blocked_urls=None,
+                 preload_history=True, validate=True, tolerances=None):
         self.username = username
         self.password = password
-        self.base_url = "https://www.easybourse.com"
+        self.base_url = base_url
         self.valorisation_url = f"{self.base_url}/secure/compte/valorisation"
+        self.export_url = f"{self.base_url}/easybourse/secure/exportCsvValorisationTempsReel.html?siteLanguage=fr"
+
+        # 'http' fetches the export with the browser session cookies, 'browser' lets Chrome download it
+        self.download_mode = download_mode
+        self.http = None
 
         # Define download directory
         if download_dir is None:
@@ -30,8 +153,70 @@ class EasyBourseValorisationDownloader:
 
         logger.info(f"Download directory: {self.download_dir}")
 
+        # Optional Chrome profile directory (one per account when running several in parallel),
+        # a persistent one keeps the cookie banner choice and the cache between runs
+        self.profile_dir = profile_dir
+
+        # Lean profile (opt-in until checked against the live site): no images, media, fonts or trackers,
+        # driver.get() returns once the DOM is ready
+        self.lean_profile = lean_profile
+        self.blocked_urls = LEAN_BLOCKED_URLS if blocked_urls is None else blocked_urls
+
+        # Timeout (seconds) of each wait in the login and download steps
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.step_timings = {}
+
+        # Failure class of the last run (see TRANSIENT_FAILURES), None if it succeeded or is unclassified
+        self.failure = None
+
+        # Optional history store (Parquet folder or SQLite file), Excel is then an export
+        self.history_store = history_store
+        self.export_excel = export_excel
+        self.parquet_export_dir = parquet_export_dir
+
+        # Read the Excel history in a background thread while Chrome starts and logs in, kept in memory
+        # until the workbook changes so that cycles of the daemon do not read it again
+        self.preload_history = preload_history
+        self.history_cache = None
+
+        # Normalized layout: positions in Data, one row per date in Totals (None keeps the workbook's layout)
+        self.normalized_layout = normalized_layout
+
+        # Skip backup, merge and save when the export matches the stored fingerprint
+        self.skip_unchanged = skip_unchanged
+
+        # 'incremental' stores changed date blocks in <history>_Backup after each update, 'copy' copies the
+        # workbook to Save/ before
+        self.backup_mode = backup_mode
+
+        # Maintain the Portfolio and Positions analytics tables next to the history
+        self.analytics = analytics
+
+        # Check each date block before merging it, blocks failing a check go to <history>_Quarantine
+        # (tolerances overrides easybourse_quality.DEFAULT_TOLERANCES)
+        self.validate = validate
+        self.tolerances = tolerances
+
+        # Engine used for full rewrites: 'xlsxwriter' (streaming) or 'openpyxl'
+        self.excel_engine = excel_engine
+
+        # Per-phase metrics of each run: JSON line in <history>_runs.jsonl, optional Prometheus textfile
+        self.run_log = run_log
+        self.prometheus_path = prometheus_path
+        self.metrics = None
+
+    def phase(self, name):
+        """Time a phase of the current run; the yielded dict takes its rows and bytes read or written"""
+        if self.metrics is None:
+            return nullcontext({})
+        return self.metrics.phase(name)
+
     def setup_driver(self):
         """Configure and return a Selenium driver with automatic download"""
+        # Selenium is only imported by the commands that drive the browser
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+
         try:
             options = Options()
 
@@ -43,6 +228,11 @@ class EasyBourseValorisationDownloader:
                 "safebrowsing.enabled": True,
                 "plugins.always_open_pdf_externally": True  # For PDFs if needed
             }
+            if self.lean_profile:
+                prefs["profile.managed_default_content_settings.images"] = 2
+                options.add_argument('--blink-settings=imagesEnabled=false')
+                options.add_argument('--autoplay-policy=user-gesture-required')
+                options.page_load_strategy = 'eager'
             options.add_experimental_option("prefs", prefs)
 
             # ===== HEADLESS MODE ENABLED =====
@@ -62,13 +252,22 @@ class EasyBourseValorisationDownloader:
             options.add_argument('--disable-features=VizDisplayCompositor')
             options.add_argument('--disable-extensions')
 
+            if self.profile_dir:
+                options.add_argument(f'--user-data-dir={os.path.abspath(self.profile_dir)}')
+
             # To reduce logs
             options.add_argument('--log-level=3')  # Fatal errors only
             options.add_argument('--silent')
 
             driver = webdriver.Chrome(options=options)
+            driver.set_page_load_timeout(self.timeouts['page_load'])
             driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
 
+            if self.lean_profile and self.blocked_urls:
+                # Fonts, media and trackers have no pref, their requests are blocked through DevTools
+                driver.execute_cdp_cmd('Network.enable', {})
+                driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_urls})
+
             # No need for set_window_size as already defined in options
 
             return driver
@@ -76,122 +275,215 @@ class EasyBourseValorisationDownloader:
             logger.error(f"Error configuring driver: {e}")
             raise
 
+    def find_virtual_keyboard(self, driver):
+        """Detect the virtual keyboard in one script call and return a digit -> button mapping"""
+        keypad = driver.execute_script(FIND_VIRTUAL_KEYBOARD_JS)
+        if keypad and len(keypad) == 10:
+            logger.info("✅ Virtual keyboard detected")
+            return keypad
+        return None
+
+    def wait_for(self, driver, step, condition, message=''):
+        """Wait until condition(driver) is truthy, adding the time waited to the step timings"""
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        start = time.perf_counter()
+        try:
+            return WebDriverWait(driver, self.timeouts[step], poll_frequency=0.1).until(condition, message)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.step_timings[step] = round(self.step_timings.get(step, 0) + elapsed, 3)
+
+    def until_settled(self, step, condition, page_before):
+        """Wrap a wait condition to raise a layout failure once the page is loaded and settled without it
+
+        The rule only applies once the browser navigated away from page_before (the
+        performance.timeOrigin of the document before the action): a page re-rendered in
+        place stays 'complete' while it renders, so it gets the whole timeout of the step.
+        """
+        from selenium.common.exceptions import NoSuchElementException
+
+        loaded_since = None
+
+        def settled_condition(driver):
+            nonlocal loaded_since
+            try:
+                result = condition(driver)
+            except NoSuchElementException:
+                result = False
+            if result:
+                return result
+            page, ready_state = driver.execute_script(PAGE_STATE_JS)
+            if page == page_before or ready_state != 'complete':
+                loaded_since = None
+            elif loaded_since is None:
+                loaded_since = time.perf_counter()
+            elif time.perf_counter() - loaded_since > self.timeouts['settle']:
+                raise FetchError(LAYOUT_FAILURE, f"{step}: page loaded without the expected element")
+            return False
+
+        return settled_condition
+
+    def check_login_error(self, driver):
+        """Raise a credentials failure if the login page shows an error message"""
+        error = driver.execute_script(FIND_LOGIN_ERROR_JS)
+        if error:
+            raise FetchError(CREDENTIALS_FAILURE, f"login rejected: {error}")
+
     def login(self, driver):
-        """Log in to EasyBourse"""
+        """Log in to EasyBourse, setting the failure class when it fails"""
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+
         try:
             # Step 1: Login page - Enter username
             logger.info("Navigating to login page...")
+            page_before = driver.execute_script(PAGE_STATE_JS)[0]
             driver.get(f"{self.base_url}/login")
 
             # Wait for username field to be visible
-            wait = WebDriverWait(driver, 10)
-            username_field = wait.until(
-                EC.presence_of_element_located((By.NAME, "username"))
+            username_field = self.wait_for(
+                driver, 'login_page',
+                self.until_settled('login_page', EC.presence_of_element_located((By.NAME, "username")), page_before)
             )
 
             # Accept cookies if present
             try:
                 logger.info("Accepting cookies...")
-                time.sleep(2)
-                driver.find_element(By.XPATH, "//button[contains(text(), 'Ok pour moi')]").click()
-            except:
-                pass
+                cookie_button = (By.XPATH, "//button[contains(text(), 'Ok pour moi')]")
+                self.wait_for(driver, 'cookie_banner', EC.element_to_be_clickable(cookie_button)).click()
+                self.wait_for(driver, 'cookie_banner_closed', EC.invisibility_of_element_located(cookie_button))
+            except TimeoutException:
+                logger.info("No cookie banner")
 
             logger.info("Entering username...")
             username_field.send_keys(self.username)
 
             # Click Continue button
             continue_button = driver.find_element(By.XPATH, "//button[contains(text(), 'Continuer')]")
+            page_before = driver.execute_script(PAGE_STATE_JS)[0]
             continue_button.click()
 
-            # Step 2: Password page
+            # Step 2: Password page - wait for the keypad or a password field (an unknown id shows an error)
             logger.info("Waiting for password page...")
-            time.sleep(2)
 
-            # Handle virtual keyboard or normal field
-            try:
-                # Detect virtual keyboard
-                virtual_keyboard = None
-                for key_id in range(1000):
-                    try:
-                        elements = driver.find_elements(By.CLASS_NAME, f"jss{key_id}")
-                        digits = [el.text.strip() for el in elements if
-                                  el.text.strip().isdigit() and len(el.text.strip()) == 1]
-                        if set(digits) == set("0123456789"):
-                            virtual_keyboard = elements
-                            logger.info(f"✅ Virtual keyboard detected with jss{key_id}")
-                            break
-                    except:
-                        continue
-
-                if virtual_keyboard:
-                    logger.info("Using virtual keyboard...")
-                    for digit in self.password:
-                        for button in virtual_keyboard:
-                            if button.text == digit:
-                                button.click()
-                                time.sleep(0.2)
-                                break
-                else:
-                    # Try normal password field
-                    try:
-                        password_field = driver.find_element(By.NAME, "password")
-                        password_field.send_keys(self.password)
-                    except:
-                        logger.info("Please enter password manually...")
-                        time.sleep(30)
+            def password_page(d):
+                self.check_login_error(d)
+                return self.find_virtual_keyboard(d) or d.find_elements(By.NAME, "password")
 
-            except Exception as e:
-                logger.error(f"Error entering password: {e}")
+            password_page = self.wait_for(driver, 'password_page',
+                                          self.until_settled('password_page', password_page, page_before))
+
+            # Handle virtual keyboard or normal field
+            if isinstance(password_page, dict):
+                logger.info("Using virtual keyboard...")
+                for digit in self.password:
+                    self.wait_for(driver, 'keypad', EC.element_to_be_clickable(password_page[digit])).click()
+            else:
+                password_page[0].send_keys(self.password)
 
             # Click Login button
             login_button = driver.find_element(By.XPATH, "//button[contains(text(), 'Se connecter')]")
             login_button.click()
 
+            # Wait until the post-login page is reached, a wrong password shows an error instead
             logger.info("Logging in...")
-            time.sleep(5)
+
+            def logged_in(d):
+                if '/login' not in d.current_url:
+                    return True
+                self.check_login_error(d)
+                return False
+
+            try:
+                self.wait_for(driver, 'post_login', logged_in)
+            except TimeoutException as e:
+                # Still on the login page after the password: rejected without a message, never retried
+                if '/login' in driver.current_url:
+                    raise FetchError(CREDENTIALS_FAILURE, "still on the login page after the password") from e
+                raise
+            logger.info(f"⏱️ Login waits (s): {self.step_timings}")
 
             return True
 
         except Exception as e:
-            logger.error(f"Login error: {e}")
+            self.failure = classify_failure(e)
+            logger.error(f"Login error ({self.failure or 'unclassified'}): {e}")
             return False
 
     def download_valorisation_csv(self, driver):
         """Download the valuation CSV file"""
+        files_before = set(os.listdir(self.download_dir))
 
         # URL for CSV download page
-        driver.get('https://www.easybourse.com/easybourse/secure/exportCsvValorisationTempsReel.html?siteLanguage=fr')
-        files_before = set(os.listdir(self.download_dir))
+        driver.get(self.export_url)
 
-        # Wait for file to download
-        timeout = 30
-        start_time = time.time()
+        # Wait for a newly created CSV file; a page displayed instead of a download means there is no export
+        def new_csv_files(d):
+            new_files = set(os.listdir(self.download_dir)) - files_before
+            csv_files = [f for f in new_files if f.endswith('.csv')]
+            if csv_files or any(f.endswith('.crdownload') for f in new_files):
+                return csv_files
+            if d.current_url.startswith(self.export_url.split('?')[0]) or '/login' in d.current_url:
+                raise FetchError(EMPTY_EXPORT_FAILURE, f"the export answered a page: {d.current_url}")
+            return False
 
-        while time.time() - start_time < timeout:
-            files_after = set(os.listdir(self.download_dir))
-            new_files = files_after - files_before
+        csv_files = self.wait_for(driver, 'download', new_csv_files)
 
-            # Look for newly created CSV file
-            csv_files = [f for f in new_files if f.endswith('.csv')]
+        csv_filename = csv_files[0]
+        logger.info(f"CSV file downloaded: {csv_filename} ({self.step_timings['download']}s)")
+        return os.path.join(self.download_dir, csv_filename)
 
-            if csv_files:
-                csv_filename = csv_files[0]
-                logger.info(f"CSV file downloaded: {csv_filename}")
-                return os.path.join(self.download_dir, csv_filename)
+    def fetch_valorisation_csv(self, driver):
+        """Fetch the valuation CSV in memory over HTTP, reusing the browser session cookies"""
+        import urllib3
 
-            time.sleep(1)
+        if self.http is None:
+            self.http = urllib3.PoolManager(num_pools=2, maxsize=2)
 
-        return None
+        cookies = '; '.join(f"{c['name']}={c['value']}" for c in driver.get_cookies())
+        headers = {
+            'Cookie': cookies,
+            'User-Agent': driver.execute_script("return navigator.userAgent"),
+            'Referer': self.valorisation_url,
+        }
+
+        start = time.perf_counter()
+        try:
+            response = self.http.request('GET', self.export_url, headers=headers, retries=False,
+                                         timeout=urllib3.Timeout(total=self.timeouts['download']))
+        except urllib3.exceptions.HTTPError as e:
+            # Chrome would hit the same network error, no need to fall back to it
+            raise FetchError(NETWORK_FAILURE, f"HTTP export failed: {e}") from e
+        finally:
+            self.step_timings['download'] = round(time.perf_counter() - start, 3)
+
+        # An expired session is answered with an HTML page instead of the CSV
+        if response.status != 200 or b'Code Isin' not in response.data:
+            logger.warning(f"HTTP export returned no CSV (status {response.status})")
+            return None
+
+        logger.info(f"CSV fetched over HTTP: {len(response.data)} bytes ({self.step_timings['download']}s)")
+        return response.data
 
     def parse_csv_data(self, csv_path):
-        """Parse CSV file and extract data with totals as columns"""
+        """Parse CSV file (path or raw bytes) and extract data with totals as columns"""
         try:
-            # Read file with appropriate encoding
-            with open(csv_path, 'r', encoding='cp1252') as f:
-                content = f.read()
+            # Read raw bytes once, only the small part before the table is decoded as text
+            if isinstance(csv_path, bytes):
+                raw = csv_path
+            else:
+                with open(csv_path, 'rb') as f:
+                    raw = f.read()
 
-            lines = content.split('\n')
+            # Find beginning of positions table
+            header_pos = raw.find(CSV_TABLE_HEADER.encode('cp1252'))
+            if header_pos == -1:
+                logger.error("Table headers not found")
+                return None
+            header_line = raw.count(b'\n', 0, header_pos)
+            lines = raw[:header_pos].decode('cp1252').split('\n')
 
             # Extract valuation date (line 2)
             date_match = re.search(r'Valorisation au;(\d{2}/\d{2}/\d{4})', lines[2] if len(lines) > 2 else '')
@@ -207,78 +499,56 @@ class EasyBourseValorisationDownloader:
             totals_dict = {}
 
             logger.info("Extracting totals...")
-            for i in range(7, 13):  # Lines 7 to 12
-                if i < len(lines) and lines[i].strip():
-                    parts = lines[i].split(';')
-                    if len(parts) >= 2 and parts[0].strip():
-                        label = parts[0].strip()
-                        montant = parts[1].strip() if len(parts) > 1 else '0'
-
-                        try:
-                            # Convert amount
-                            montant_float = float(montant.replace(',', '.').replace(' ', ''))
-
-                            # Map labels to column names
-                            if label == 'Total positions sous dossier':
-                                totals_dict['Total positions sous dossier'] = montant_float
-                            elif label == 'Solde espèces':
-                                totals_dict['Solde espèces'] = montant_float
-                            elif label == 'Valeur totale':
-                                totals_dict['Valeur totale'] = montant_float
-
-                            logger.info(f"  • {label}: {montant_float:,.2f}€")
-
-                        except ValueError as e:
-                            logger.warning(f"Unable to convert value for {label}: {montant}")
+            for line in lines[7:13]:
+                parts = line.split(';')
+                if len(parts) >= 2 and parts[0].strip():
+                    label = parts[0].strip()
+                    montant = parts[1].strip()
 
-            # Find beginning of positions table
-            header_index = -1
-            for i, line in enumerate(lines):
-                if 'Valeur;Code Isin;Place de cotation' in line:
-                    header_index = i
-                    break
+                    try:
+                        # Convert amount
+                        montant_float = float(montant.replace(',', '.').replace(' ', ''))
 
-            if header_index == -1:
-                logger.error("Table headers not found")
-                return None
+                        # Map labels to column names
+                        if label in TOTAL_COLUMNS:
+                            totals_dict[label] = montant_float
+
+                        logger.info(f"  • {label}: {montant_float:,.2f}€")
 
-            # Extract positions
-            positions_lines = []
-            for i in range(header_index, len(lines)):
-                if lines[i].strip() and ';' in lines[i]:
-                    positions_lines.append(lines[i])
+                    except ValueError:
+                        logger.warning(f"Unable to convert value for {label}: {montant}")
 
-            # Parse positions
-            import io
-            positions_content = '\n'.join(positions_lines)
-            df = pd.read_csv(io.StringIO(positions_content), sep=';', decimal=',')
+            # Parse positions straight from the raw bytes, "1 033,44" is read as 1033.44
+            df = pd.read_csv(io.BytesIO(raw), sep=';', skiprows=header_line, encoding='cp1252',
+                             decimal=',', thousands=' ',
+                             dtype={col: 'category' for col in CATEGORICAL_COLUMNS})
 
-            # Clean columns
+            # Clean columns and drop lines without any separator
             df.columns = df.columns.str.strip()
+            if len(df.columns) > 1:
+                has_values = df.iloc[:, 1:].notna().any(axis=1)
+                if not has_values.all():
+                    df = df[has_values].reset_index(drop=True)
+
+            # Convert numeric columns left as text: "-0,45%" -> -0.45, bad values -> NaN
+            for col in NUMERIC_COLUMNS:
+                if col in df.columns:
+                    if not pd.api.types.is_numeric_dtype(df[col]):
+                        values = df[col].astype(str).str.strip()
+                        values = values.str.replace(' ', '', regex=False).str.replace(',', '.', regex=False)
+                        if col == 'Performance (%)':
+                            values = values.str.replace('%', '', regex=False)
+                        df[col] = pd.to_numeric(values, errors='coerce')
+                    if df[col].dtype != 'float64':
+                        df[col] = df[col].astype('float64')
+
+            for col in CATEGORICAL_COLUMNS:
+                if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+                    df[col] = df[col].astype('category')
 
             # Add date
             df['Date'] = valorisation_date
 
-            # Convert numeric columns
-            numeric_columns = ['Quantité', 'Cours', 'Prix moyen', 'Valorisation', '+/- value', 'Performance (%)',
-                               'Poids']
-
-            for col in numeric_columns:
-                if col in df.columns:
-                    def safe_convert(x):
-                        if pd.isna(x):
-                            return x
-                        try:
-                            x_str = str(x).strip()
-                            x_str = x_str.replace(' ', '').replace(',', '.')
-                            if col == 'Performance (%)' and '%' in x_str:
-                                x_str = x_str.replace('%', '')
-                            return float(x_str)
-                        except:
-                            return None
-
-                    df[col] = df[col].apply(safe_convert)
-
             # IMPORTANT: Add totals as columns (same value for all rows)
             for col_name, value in totals_dict.items():
                 df[col_name] = value
@@ -301,179 +571,53 @@ class EasyBourseValorisationDownloader:
             logger.error(traceback.format_exc())
             return None
 
-    def update_excel(self, df_new, excel_path='EasyBourse.xlsx'):
-        """Update Excel file with new data including total columns"""
+    def use_normalized_layout(self, excel_path):
+        """Return True if the workbook must be written in the normalized layout"""
+        if self.normalized_layout is not None:
+            return self.normalized_layout
+        return os.path.exists(excel_path) and has_totals_sheet(excel_path)
+
+    def update_excel(self, df_new, excel_path='EasyBourse.xlsx', df_existing=None):
+        """Update Excel file with new data including total columns
+
+        df_existing is the history when it was already loaded (see start_history_preload);
+        it is then merged in memory and the file rewritten, without reading it again.
+        """
         try:
             logger.info(f"📁 Updating file: {excel_path}")
 
-            # Total columns to manage
-            TOTAL_COLUMNS = ['Valeur totale', 'Total positions sous dossier', 'Solde espèces']
-
-            # Ensure total columns exist in df_new
-            for col in TOTAL_COLUMNS:
-                if col not in df_new.columns:
-                    df_new[col] = None
+            normalized = self.use_normalized_layout(excel_path)
 
             # Check if Excel file exists
-            if os.path.exists(excel_path):
+            if df_existing is not None:
+                logger.info(f"📊 Preloaded history: {len(df_existing)} rows")
+            elif os.path.exists(excel_path):
                 # Read existing file
-                df_existing = pd.read_excel(excel_path, sheet_name='Data')
+                with self.phase('read_history') as phase:
+                    df_existing = read_history(excel_path)
+                    phase.update(rows=len(df_existing), bytes_read=os.path.getsize(excel_path))
                 logger.info(f"📊 Existing file loaded: {len(df_existing)} rows")
-
-                # Ensure total columns exist in df_existing
-                for col in TOTAL_COLUMNS:
-                    if col not in df_existing.columns:
-                        df_existing[col] = None
-
-                # Ensure dates are in correct format
-                df_existing['Date'] = pd.to_datetime(df_existing['Date'])
-                df_new['Date'] = pd.to_datetime(df_new['Date'])
-
-                # Get unique dates from new CSV
-                new_dates = df_new['Date'].unique()
-
-                # Process each date from new CSV
-                for date in new_dates:
-                    # Extract data for this date
-                    df_date_new = df_new[df_new['Date'] == date].copy()
-
-                    # Get total values for this date (same for all rows)
-                    totals_values = {}
-                    for col in TOTAL_COLUMNS:
-                        if col in df_date_new.columns and not df_date_new[col].isna().all():
-                            totals_values[col] = df_date_new[col].iloc[0]  # Take first value
-
-                    logger.info(f"📅 Processing date {date.strftime('%d/%m/%Y')}")
-                    logger.info(f"   Totals: {totals_values}")
-
-                    # Check if this date already exists in Excel file
-                    if date in df_existing['Date'].values:
-                        logger.info(f"✅ Date {date.strftime('%d/%m/%Y')} already exists in Excel")
-
-                        # For each position of this date in new CSV
-                        for idx, row in df_date_new.iterrows():
-                            valeur = row['Valeur']
-
-                            # Check if this stock already exists for this date
-                            mask = (df_existing['Date'] == date) & (df_existing['Valeur'] == valeur)
-
-                            if mask.any():
-                                # Update existing row
-                                logger.info(f"   🔄 Updating {valeur}")
-                                update_idx = df_existing[mask].index[0]
-
-                                # Update all columns
-                                for col in df_new.columns:
-                                    df_existing.at[update_idx, col] = row[col]
-                            else:
-                                # Add new position
-                                logger.info(f"   ➕ Adding {valeur}")
-
-                                # Find where to insert new row
-                                date_mask = df_existing['Date'] == date
-                                if date_mask.any():
-                                    last_idx_for_date = df_existing[date_mask].index[-1]
-                                    insert_idx = last_idx_for_date + 1
-                                else:
-                                    insert_idx = len(df_existing)
-
-                                # Insert new row
-                                df_existing = pd.concat([
-                                    df_existing.iloc[:insert_idx],
-                                    pd.DataFrame([row]),
-                                    df_existing.iloc[insert_idx:]
-                                ], ignore_index=True)
-
-                        # Update total columns for all rows of this date
-                        date_mask = df_existing['Date'] == date
-                        for col, value in totals_values.items():
-                            df_existing.loc[date_mask, col] = value
-                            logger.info(f"   📊 Updating {col} = {value:,.2f} for all rows")
-
-                    else:
-                        # Date doesn't exist, add all rows
-                        logger.info(f"🆕 New date {date.strftime('%d/%m/%Y')}, adding {len(df_date_new)} rows")
-
-                        # Find where to insert according to chronological order
-                        if len(df_existing) > 0:
-                            dates_existing = df_existing['Date'].unique()
-                            dates_existing_sorted = sorted(dates_existing)
-
-                            insert_position = None
-                            for i, existing_date in enumerate(dates_existing_sorted):
-                                if date < existing_date:
-                                    first_idx_of_date = df_existing[df_existing['Date'] == existing_date].index[0]
-                                    insert_position = first_idx_of_date
-                                    break
-
-                            if insert_position is None:
-                                insert_position = len(df_existing)
-
-                            # Insert new data
-                            df_existing = pd.concat([
-                                df_existing.iloc[:insert_position],
-                                df_date_new,
-                                df_existing.iloc[insert_position:]
-                            ], ignore_index=True)
-                        else:
-                            df_existing = df_date_new
-
-                df_combined = df_existing
-
             else:
-                # If file doesn't exist, use new data
-                df_combined = df_new
+                df_existing = None
                 logger.info(f"🆕 Creating new Excel file with {len(df_new)} rows")
 
-            # Sort by date then by value
-            df_combined = df_combined.sort_values(['Date', 'Valeur'], ascending=[True, True])
-
-            # Reset index
-            df_combined = df_combined.reset_index(drop=True)
-
-            # Clean df_combined: remove Unnamed columns
-            df_combined = df_combined.loc[:, ~df_combined.columns.str.contains('Unnamed')]
+            # Upsert every date block of the new CSV at once
+            with self.phase('merge') as phase:
+                df_combined, stats = upsert_positions(df_existing, df_new)
+                phase['rows'] = len(df_combined)
+            for date, counts in stats.items():
+                logger.info(f"📅 Date {date.strftime('%d/%m/%Y')}: "
+                            f"{counts['updated']} updated, {counts['added']} added")
 
             logger.info(f"📊 Total after update: {len(df_combined)} rows")
 
             # Save to Excel
-            logger.info(f"💾 Saving to: {excel_path}")
-            with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
-                df_combined.to_excel(writer, sheet_name='Data', index=False)
-
-                # Adjust column widths
-                worksheet = writer.sheets['Data']
-                for idx, column in enumerate(df_combined.columns):
-                    column_length = max(
-                        df_combined[column].astype(str).map(len).max(),
-                        len(column)
-                    )
-                    # Handle columns beyond Z
-                    if idx < 26:
-                        col_letter = chr(65 + idx)
-                    else:
-                        col_letter = chr(65 + idx // 26 - 1) + chr(65 + idx % 26)
-                    worksheet.column_dimensions[col_letter].width = min(column_length + 2, 50)
-
-                # Format total columns with background color
-                from openpyxl.styles import PatternFill, Font
-                light_blue_fill = PatternFill(start_color="E6F3FF", end_color="E6F3FF", fill_type="solid")
-                bold_font = Font(bold=True)
-
-                # Find total column indices
-                for col_name in TOTAL_COLUMNS:
-                    if col_name in df_combined.columns:
-                        col_idx = df_combined.columns.get_loc(col_name) + 1  # +1 because Excel starts at 1
-
-                        # Format header
-                        header_cell = worksheet.cell(row=1, column=col_idx)
-                        header_cell.fill = light_blue_fill
-                        header_cell.font = bold_font
-
-                        # Format data with light background
-                        for row in range(2, len(df_combined) + 2):
-                            cell = worksheet.cell(row=row, column=col_idx)
-                            cell.fill = light_blue_fill
+            with self.phase('write_excel') as phase:
+                write_data_sheet(df_combined, excel_path, self.excel_engine, normalized)
+                phase.update(rows=len(df_combined), bytes_written=os.path.getsize(excel_path))
+            if self.preload_history:
+                # The next run merges into this frame unless the workbook is changed meanwhile
+                self.history_cache = (excel_path, os.path.getmtime(excel_path), df_combined)
 
             logger.info(f"✅ Excel file updated: {excel_path}")
             return True
@@ -484,6 +628,48 @@ class EasyBourseValorisationDownloader:
             logger.error(traceback.format_exc())
             return False
 
+    def update_history(self, df_new, excel_path='EasyBourse.xlsx'):
+        """Update the history store with new data, then export it to Excel and/or Parquet"""
+        try:
+            store = open_history_store(self.history_store)
+            logger.info(f"📁 Updating history store: {self.history_store}")
+
+            # First run on a store: import the existing Excel history
+            if not store.dates() and os.path.exists(excel_path):
+                df_existing = read_history(excel_path)
+                df_existing = df_existing.loc[:, ~df_existing.columns.str.contains('Unnamed')]
+                df_existing['Date'] = pd.to_datetime(df_existing['Date'])
+                store.write(df_existing)
+                logger.info(f"📊 Existing Excel history imported: {len(df_existing)} rows")
+
+            # Only the partitions of the new dates are read and rewritten
+            with self.phase('merge') as phase:
+                stats = update_store(store, df_new)
+                phase['rows'] = len(df_new)
+            for date, counts in stats.items():
+                logger.info(f"📅 Date {date.strftime('%d/%m/%Y')}: "
+                            f"{counts['updated']} updated, {counts['added']} added")
+
+            normalized = self.use_normalized_layout(excel_path)
+            if self.export_excel or self.parquet_export_dir:
+                with self.phase('write_excel') as phase:
+                    n_rows = export_history(store,
+                                            excel_path=excel_path if self.export_excel else None,
+                                            parquet_dir=self.parquet_export_dir,
+                                            engine=self.excel_engine,
+                                            normalized=normalized)
+                    phase['rows'] = n_rows
+                    if self.export_excel:
+                        phase['bytes_written'] = os.path.getsize(excel_path)
+                logger.info(f"✅ History exported: {n_rows} rows")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Error updating history store: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return False
+
     def backup_excel(self, excel_path):
         """Create a backup of the Excel file before modification"""
         if os.path.exists(excel_path):
@@ -504,77 +690,347 @@ class EasyBourseValorisationDownloader:
                     os.remove(os.path.join(backup_dir, old_backup))
                     logger.info(f"Old backup deleted: {old_backup}")
 
-    def run(self, excel_path=None):
-        """Execute complete process"""
-        driver = None
+    def load_history(self, excel_path):
+        """Load the whole history from the history store or the Excel file"""
+        if self.history_store:
+            return open_history_store(self.history_store).load()
+        return read_history(excel_path)
+
+    def save_history(self, df, excel_path, df_existing=None):
+        """Back up and merge df into the history (history store or Excel file)
+
+        df_existing is the Excel history when it was already loaded (ignored with a history store).
+        Date blocks failing a data-quality check are quarantined instead; False if none is left.
+        """
+        if self.validate:
+            with self.phase('validate') as phase:
+                issues, rejected = check_blocks(df, self.tolerances)
+                phase['rows'] = len(df)
+            if rejected.any():
+                quarantine(df[rejected], issues, quarantine_dir(excel_path))
+                df = df[~rejected]
+            if len(df) == 0:
+                self.failure = INVALID_EXPORT_FAILURE
+                logger.error("❌ Export quarantined, the history is left unchanged")
+                return False
+
+        if self.backup_mode == 'copy' and not self.history_store and os.path.exists(excel_path):
+            with self.phase('backup') as phase:
+                self.backup_excel(excel_path)
+                phase['bytes_written'] = os.path.getsize(excel_path)
+
+        # The first incremental backup must hold the history as it was before this update
+        snapshot_backup = SnapshotBackup(backup_dir(excel_path))
+        if (self.backup_mode == 'incremental' and not snapshot_backup.state()
+                and os.path.exists(self.history_store or excel_path)):
+            try:
+                with self.phase('backup'):
+                    if df_existing is None or self.history_store:
+                        df_existing = self.load_history(excel_path)
+                        if self.history_store and len(df_existing) == 0 and os.path.exists(excel_path):
+                            # Empty store, the Excel history is imported by this update
+                            df_existing = read_history(excel_path)
+                    snapshot_backup.snapshot(df_existing)
+            except Exception as e:
+                logger.warning(f"Unable to back up the history before its update: {e}")
+
+        if self.history_store:
+            updated = self.update_history(df, excel_path)
+        else:
+            # Update Excel - IMPORTANT: Pass excel_path as parameter!
+            updated = self.update_excel(df, excel_path, df_existing)
+
+        if updated and self.backup_mode == 'incremental':
+            try:
+                with self.phase('backup'):
+                    snapshot_backup.snapshot_update(df, lambda: self.load_history(excel_path))
+            except Exception as e:
+                logger.warning(f"Unable to create backup snapshot: {e}")
+
+        if updated and self.analytics:
+            try:
+                with self.phase('analytics') as phase:
+                    phase['rows'] = AnalyticsTables(analytics_dir(excel_path)).update(
+                        df, lambda: self.load_history(excel_path))
+            except Exception as e:
+                logger.warning(f"Unable to update analytics: {e}")
+        return updated
+
+    def restore_backup(self, excel_path, until=None):
+        """Rewrite the history (store and exports, or Excel file) as backed up as of until (latest if None)"""
+        snapshot_backup = SnapshotBackup(backup_dir(excel_path))
+        df = snapshot_backup.restore(until)
+        if df is None:
+            logger.error("No backup snapshot to restore")
+            return False
+        normalized = self.use_normalized_layout(excel_path)
+        if self.history_store:
+            # Dates added after the snapshot are removed from the store too
+            store = open_history_store(self.history_store)
+            replace_store(store, df)
+            export_history(store, excel_path=excel_path if self.export_excel else None,
+                           parquet_dir=self.parquet_export_dir, engine=self.excel_engine, normalized=normalized)
+        else:
+            write_data_sheet(df, excel_path, self.excel_engine, normalized)
+
+        # The restored history becomes the latest snapshot, so later updates build on it
+        snapshot_backup.snapshot(df, complete=True)
+        if self.analytics:
+            AnalyticsTables(analytics_dir(excel_path)).rebuild(df)
+
+        # Stored fingerprints describe the history before the restore
+        if os.path.exists(fingerprints_path(excel_path)):
+            os.remove(fingerprints_path(excel_path))
+        logger.info(f"✅ History restored to {until or 'latest snapshot'}: {len(df)} rows")
+        return True
+
+    def write_metrics(self, excel_path, status):
+        """Append the metrics of the current run to the run log and the Prometheus textfile"""
+        if self.metrics is None:
+            return
+        record = self.metrics.record(status, failure=self.failure, waits=self.step_timings)
+        self.metrics = None
+        try:
+            if self.run_log:
+                append_run_log(run_log_path(excel_path), record)
+            if self.prometheus_path:
+                write_prometheus(self.prometheus_path, record)
+        except OSError as e:
+            logger.warning(f"Unable to write run metrics: {e}")
+        logger.info("⏱️ Phases (s): " + ', '.join(f"{name} {values['seconds']}"
+                                                  for name, values in record['phases'].items()))
+
+    def remove_csv(self, csv_path):
+        """Delete a downloaded CSV file (nothing to do when fetched in memory)"""
+        if csv_path is not None:
+            try:
+                os.remove(csv_path)
+                logger.info(f"Temporary CSV file deleted: {csv_path}")
+            except Exception as e:
+                logger.warning(f"Unable to delete CSV: {e}")
+
+    def session_alive(self, driver):
+        """Return True if the browser session is still logged in"""
+        from selenium.common.exceptions import WebDriverException
+
         try:
-            # Define Excel file path
-            if excel_path is None:
-                excel_path = 'EasyBourse.xlsx'
+            driver.get(self.valorisation_url)
+            return '/login' not in driver.current_url
+        except WebDriverException:
+            return False
 
-            # Create absolute path if necessary
-            excel_path = os.path.abspath(excel_path)
-            logger.info(f"Target Excel file: {excel_path}")
+    def download(self, driver):
+        """Download the valuation CSV with a logged-in driver, over HTTP first when enabled
 
-            # Configure driver
-            driver = self.setup_driver()
+        Returns (csv_data, csv_path): the bytes when fetched in memory, the file
+        downloaded by Chrome otherwise, (None, None) on failure.
+        """
+        csv_data = None
+        csv_path = None
+        with self.phase('download') as phase:
+            try:
+                if self.download_mode == 'http':
+                    csv_data = self.fetch_valorisation_csv(driver)
+                if csv_data is None:
+                    csv_path = self.download_valorisation_csv(driver)
+            except Exception as e:
+                self.failure = classify_failure(e)
+                logger.error(f"CSV download failed ({self.failure or 'unclassified'}): {e}")
+                return None, None
+            phase['bytes_read'] = len(csv_data) if csv_data is not None else os.path.getsize(csv_path)
+
+        logger.info(f"⏱️ Waits (s): {self.step_timings}")
+        return csv_data, csv_path
+
+    def fetch(self, driver):
+        """Download and parse the valuation CSV with a logged-in driver
+
+        Returns (df, csv_path), csv_path being None when the CSV was fetched in memory
+        and df None on failure.
+        """
+        csv_data, csv_path = self.download(driver)
+        if csv_data is None and csv_path is None:
+            return None, None
+
+        # Parse data
+        with self.phase('parse') as phase:
+            df = self.parse_csv_data(csv_data if csv_data is not None else csv_path)
+            if df is None:
+                self.failure = EMPTY_EXPORT_FAILURE
+                logger.error("CSV parsing failed")
+                return None, csv_path
+            phase['rows'] = len(df)
+        if len(df) == 0:
+            self.failure = EMPTY_EXPORT_FAILURE
+            logger.error("The export holds no position")
+            return None, csv_path
+        return df, csv_path
+
+    def start_history_preload(self, excel_path):
+        """Start reading the Excel history in a background thread, returns a future or None
+
+        Reading the workbook is CPU bound but the browser steps mostly wait on the
+        network, so both overlap even in threads. The future gives (mtime, df). The
+        history read is kept until the workbook changes: a run that finds the valuation
+        unchanged does not need it, and the next one reuses it instead of reading again.
+        """
+        if not self.preload_history or self.history_store or not os.path.exists(excel_path):
+            return None
 
-            # Login
-            if not self.login(driver):
-                logger.error("Login failed")
-                return False
+        mtime = os.path.getmtime(excel_path)
+        if self.history_cache is not None and self.history_cache[:2] == (excel_path, mtime):
+            future = Future()
+            future.set_result(self.history_cache[1:])
+            return future
+
+        def load():
+            df = read_history(excel_path)
+            self.history_cache = (excel_path, mtime, df)
+            return mtime, df
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='history-preload')
+        future = executor.submit(load)
+        executor.shutdown(wait=False)
+        return future
+
+    def collect_history_preload(self, future, excel_path):
+        """Wait for the preloaded history, None if it failed or the file changed since"""
+        if future is None:
+            return None
+        with self.phase('history_wait') as phase:
+            try:
+                mtime, df = future.result()
+            except Exception as e:
+                logger.warning(f"History preload failed, reading it again: {e}")
+                return None
+            phase['rows'] = len(df)
+        if not os.path.exists(excel_path) or os.path.getmtime(excel_path) != mtime:
+            logger.info("History changed since it was preloaded, reading it again")
+            return None
+        return df
+
+    def compact_intraday(self, excel_path, until):
+        """Merge the last snapshot of every intraday day up to until (YYYY-MM-DD) into the history"""
+        store = IntradayStore(intraday_dir(excel_path))
+        compacted = 0
+        for day in store.days():
+            if day > until:
+                break
+            df = store.end_of_day(day)
+            logger.info(f"📦 Compacting intraday snapshots of {day}: {len(df)} positions")
+            self.failure = None
+            if not self.save_history(df, excel_path):
+                if self.failure != INVALID_EXPORT_FAILURE:
+                    return compacted
+                # Kept in the quarantine, the day must not block the compaction of the next ones
+                store.remove(day)
+                continue
+            save_fingerprints(fingerprints_path(excel_path), fingerprint_dates(df))
+            store.remove(day)
+            compacted += 1
+        return compacted
+
+    def run(self, excel_path=None, driver=None, intraday=False):
+        """Execute complete process, reusing driver (and its session) when given
+
+        With intraday, the export is only appended to the intraday store as a
+        timestamped snapshot; compact_intraday() later merges each day into the history.
+        """
+        own_driver = driver is None
+        status = 'failed'
+        self.failure = None
+        self.metrics = RunMetrics()
+
+        # Define Excel file path
+        if excel_path is None:
+            excel_path = 'EasyBourse.xlsx'
+
+        # Create absolute path if necessary
+        excel_path = os.path.abspath(excel_path)
+        try:
+            logger.info(f"Target Excel file: {excel_path}")
+            self.step_timings = {}
 
+            # The history is read while the browser starts and logs in
+            history_preload = None if intraday else self.start_history_preload(excel_path)
 
-            # Download CSV
-            csv_path = self.download_valorisation_csv(driver)
-            if not csv_path:
-                logger.error("CSV download failed")
-                logger.error("Check your internet connection or login credentials")
+            # Configure driver
+            if own_driver:
+                with self.phase('setup_driver'):
+                    driver = self.setup_driver()
+
+            # Login, unless the given driver is still logged in
+            with self.phase('login'):
+                if not own_driver and self.session_alive(driver):
+                    logger.info("Session still active, skipping login")
+                    logged_in = True
+                else:
+                    logged_in = self.login(driver)
+            if not logged_in:
+                logger.error("Login failed")
                 return False
 
-            # Parse data
-            df = self.parse_csv_data(csv_path)
+            # Download and parse CSV
+            df, csv_path = self.fetch(driver)
             if df is None:
-                logger.error("CSV parsing failed")
                 return False
 
-            # Create backup if file exists
-            if os.path.exists(excel_path):
-                self.backup_excel(excel_path)
+            if intraday:
+                with self.phase('intraday') as phase:
+                    n_rows = IntradayStore(intraday_dir(excel_path)).append(df)
+                    phase['rows'] = n_rows
+                if n_rows:
+                    logger.info(f"🕒 Intraday snapshot stored: {n_rows} rows")
+                else:
+                    logger.info("🕒 Intraday snapshot unchanged, not stored")
+                self.remove_csv(csv_path)
+                status = 'intraday'
+                return True
 
-            # Update Excel - IMPORTANT: Pass excel_path as parameter!
-            if self.update_excel(df, excel_path):  # <-- Fix here
+            # Nothing to do if this valuation was already stored as is
+            with self.phase('fingerprint') as phase:
+                fingerprints = fingerprint_dates(df)
+                fingerprint_file = fingerprints_path(excel_path)
+                history_exists = os.path.exists(self.history_store or excel_path)
+                unchanged = False
+                if self.skip_unchanged and history_exists:
+                    stored = load_fingerprints(fingerprint_file)
+                    unchanged = bool(fingerprints) and all(stored.get(date) == value
+                                                           for date, value in fingerprints.items())
+                phase['rows'] = len(df)
+            if unchanged:
+                logger.info("💤 Valuation unchanged since last run, nothing to update")
+                self.remove_csv(csv_path)
+                status = 'unchanged'
+                return True
+
+            df_existing = self.collect_history_preload(history_preload, excel_path)
+            if self.save_history(df, excel_path, df_existing):
+                save_fingerprints(fingerprint_file, fingerprints)
                 logger.info("✅ Process completed successfully!")
 
                 # Optional: Delete downloaded CSV
-                try:
-                    os.remove(csv_path)
-                    logger.info(f"Temporary CSV file deleted: {csv_path}")
-                except Exception as e:
-                    logger.warning(f"Unable to delete CSV: {e}")
+                self.remove_csv(csv_path)
 
+                status = 'updated'
                 return True
             else:
                 return False
 
         except Exception as e:
+            self.failure = self.failure or classify_failure(e)
             logger.error(f"General error: {e}")
             import traceback
             logger.error(traceback.format_exc())
             return False
         finally:
-            if driver:
+            if own_driver and driver:
                 driver.quit()
+            self.write_metrics(excel_path, status)
 
 
-# Script usage
+# Script usage: the command line lives in easybourse_cli.py, the former flags map to its run command
 if __name__ == "__main__":
-    # Replace with your credentials
-    from logins import id, password
-
-    USERNAME = id
-    PASSWORD = password
+    from easybourse_cli import main
 
-    # Create and launch downloader
-    downloader = EasyBourseValorisationDownloader(USERNAME, PASSWORD)
-    downloader.run()
\ No newline at end of file
+    main(legacy=True)
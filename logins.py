@@ -1,2 +1,8 @@
 id = "your_EasyBourse_id"
 password = "your_EasyBourse_password"
+
+# Optional: several accounts fetched in parallel with --accounts
+# accounts = [
+#     {"name": "PEA", "id": "your_first_EasyBourse_id", "password": "your_first_password"},
+#     {"name": "CTO", "id": "your_second_EasyBourse_id", "password": "your_second_password"},
+# ]